@@ -1,19 +1,48 @@
 # database.py
 import os
+import asyncio
 import yaml
+try:
+    from yaml import CSafeLoader as YamlLoader  # libyaml
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
 import aiosqlite
 import sqlite3
 import secrets
 from datetime import datetime, timezone, timedelta
 from functools import lru_cache
-
-SCHEMA_VERSION = 7
+from contextlib import asynccontextmanager
+from fastapi import Depends, Request
+from tools.fts_sql import FTS_FLUSH_SQL, FTS_DIRTY_CLEAR_SQL
+
+SCHEMA_VERSION = 16
+
+# Per-connection tuning; -64000 = up to ~64 MB page cache (allocated on demand)
+CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous = NORMAL",  # safe with WAL, no fsync per commit
+    "PRAGMA cache_size = -64000",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA mmap_size = 268435456",  # 256 MB, reads without read() syscalls
+)
+
+# Hot statements as constants, so sqlite3's per-connection statement cache
+# (keyed by the SQL string) gets a hit instead of re-preparing them
+SESSION_LOOKUP_SQL = """
+    SELECT s.id, s.user_id, s.expires_at, s.last_seen, u.username, u.display_name, u.role, u.is_active
+    FROM sessions s
+    JOIN users u ON s.user_id = u.id
+    WHERE s.id = ?
+"""
+SESSION_DELETE_SQL = "DELETE FROM sessions WHERE id = ?"
+SESSION_TOUCH_SQL = "UPDATE sessions SET last_seen = ?, expires_at = ? WHERE id = ?"
 
 async def init_db():
     """
     Checks the database schema version and applies migrations if necessary.
     """
     async with aiosqlite.connect(get_db_path()) as db:
+        # WAL ist persistent in der DB-Datei, muss also nur einmal gesetzt werden
+        await db.execute("PRAGMA journal_mode = WAL")
         await db.execute("""
             CREATE TABLE IF NOT EXISTS db_metadata (
                 key TEXT PRIMARY KEY,
@@ -248,6 +277,200 @@ async def init_db():
             await db.execute("UPDATE db_metadata SET value = '7' WHERE key = 'schema_version'")
             current_version = 7
 
+        if current_version < 8:
+            print("Migrating to Schema v8: Adding step/ingredient position indexes...")
+            # Ordered range scans for "WHERE recipe_id=? ORDER BY position" instead of a sort
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_steps_recipe_pos ON steps(recipe_id, position)")
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_ing_step_pos ON ingredients(step_id, position)")
+            await db.execute("UPDATE db_metadata SET value = '8' WHERE key = 'schema_version'")
+            current_version = 8
+
+        if current_version < 9:
+            print("Migrating to Schema v9: Adding folders(parent_id) index...")
+            # Drives the recursive subfolder CTE
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_folders_parent ON folders(parent_id)")
+            await db.execute("UPDATE db_metadata SET value = '9' WHERE key = 'schema_version'")
+            current_version = 9
+
+        if current_version < 10:
+            print("Migrating to Schema v10: Queueing FTS step/ingredient updates in fts_dirty...")
+            await db.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS fts_dirty (
+                    recipe_id INTEGER PRIMARY KEY
+                );
+
+                DROP TRIGGER IF EXISTS recipe_fts_steps_ai;
+                DROP TRIGGER IF EXISTS recipe_fts_steps_au;
+                DROP TRIGGER IF EXISTS recipe_fts_steps_ad;
+                DROP TRIGGER IF EXISTS recipe_fts_ing_ai;
+                DROP TRIGGER IF EXISTS recipe_fts_ing_au;
+                DROP TRIGGER IF EXISTS recipe_fts_ing_ad;
+
+                -- Steps/Ingredients: nur vormerken, flush_fts() aggregiert einmal pro Rezept
+                CREATE TRIGGER recipe_fts_steps_ai AFTER INSERT ON steps
+                BEGIN
+                    INSERT OR IGNORE INTO fts_dirty(recipe_id) VALUES (NEW.recipe_id);
+                END;
+
+                CREATE TRIGGER recipe_fts_steps_au AFTER UPDATE ON steps
+                BEGIN
+                    INSERT OR IGNORE INTO fts_dirty(recipe_id) VALUES (OLD.recipe_id), (NEW.recipe_id);
+                END;
+
+                CREATE TRIGGER recipe_fts_steps_ad AFTER DELETE ON steps
+                BEGIN
+                    INSERT OR IGNORE INTO fts_dirty(recipe_id) VALUES (OLD.recipe_id);
+                END;
+
+                CREATE TRIGGER recipe_fts_ing_ai AFTER INSERT ON ingredients
+                BEGIN
+                    INSERT OR IGNORE INTO fts_dirty(recipe_id)
+                    SELECT recipe_id FROM steps WHERE id = NEW.step_id;
+                END;
+
+                CREATE TRIGGER recipe_fts_ing_au AFTER UPDATE ON ingredients
+                BEGIN
+                    INSERT OR IGNORE INTO fts_dirty(recipe_id)
+                    SELECT recipe_id FROM steps WHERE id IN (OLD.step_id, NEW.step_id);
+                END;
+
+                CREATE TRIGGER recipe_fts_ing_ad AFTER DELETE ON ingredients
+                BEGIN
+                    INSERT OR IGNORE INTO fts_dirty(recipe_id)
+                    SELECT recipe_id FROM steps WHERE id = OLD.step_id;
+                END;
+                """
+            )
+            await db.execute("UPDATE db_metadata SET value = '10' WHERE key = 'schema_version'")
+            current_version = 10
+
+        if current_version < 11:
+            print("Migrating to Schema v11: Covering ingredients index for the FTS aggregation...")
+            # item/note im Index: flush_fts() liest die Zutaten ohne Tabellenzugriff
+            await db.execute("DROP INDEX IF EXISTS idx_ing_step_pos")
+            await db.execute("CREATE INDEX idx_ing_step_pos ON ingredients(step_id, position, item, note)")
+            await db.execute("UPDATE db_metadata SET value = '11' WHERE key = 'schema_version'")
+            current_version = 11
+
+        if current_version < 12:
+            print("Migrating to Schema v12: Skipping FTS updates for unchanged text...")
+            # e.g. the updated_at bump on every save no longer rewrites the FTS row
+            await db.executescript(
+                """
+                DROP TRIGGER IF EXISTS recipe_fts_au;
+                DROP TRIGGER IF EXISTS recipe_fts_steps_au;
+                DROP TRIGGER IF EXISTS recipe_fts_ing_au;
+
+                CREATE TRIGGER recipe_fts_au AFTER UPDATE ON recipes
+                WHEN NEW.name IS NOT OLD.name OR NEW.author IS NOT OLD.author
+                     OR NEW.source IS NOT OLD.source OR NEW.preamble IS NOT OLD.preamble
+                BEGIN
+                    UPDATE recipe_fts SET
+                        name = COALESCE(NEW.name, ''),
+                        author = COALESCE(NEW.author, ''),
+                        source = COALESCE(NEW.source, ''),
+                        preamble = COALESCE(NEW.preamble, '')
+                    WHERE rowid = NEW.id;
+                END;
+
+                CREATE TRIGGER recipe_fts_steps_au AFTER UPDATE ON steps
+                WHEN NEW.markdown_text IS NOT OLD.markdown_text OR NEW.position IS NOT OLD.position
+                     OR NEW.recipe_id IS NOT OLD.recipe_id
+                BEGIN
+                    INSERT OR IGNORE INTO fts_dirty(recipe_id) VALUES (OLD.recipe_id), (NEW.recipe_id);
+                END;
+
+                CREATE TRIGGER recipe_fts_ing_au AFTER UPDATE ON ingredients
+                WHEN NEW.item IS NOT OLD.item OR NEW.note IS NOT OLD.note
+                     OR NEW.position IS NOT OLD.position OR NEW.step_id IS NOT OLD.step_id
+                BEGIN
+                    INSERT OR IGNORE INTO fts_dirty(recipe_id)
+                    SELECT recipe_id FROM steps WHERE id IN (OLD.step_id, NEW.step_id);
+                END;
+                """
+            )
+            await db.execute("UPDATE db_metadata SET value = '12' WHERE key = 'schema_version'")
+            current_version = 12
+
+        if current_version < 13:
+            print("Migrating to Schema v13: Dropping the per-ingredient updated_at trigger...")
+            # update_recipe bumps updated_at once per save; the trigger did it again for every changed row
+            await db.execute("DROP TRIGGER IF EXISTS update_recipe_timestamp_after_ingredient_update")
+            await db.execute("UPDATE db_metadata SET value = '13' WHERE key = 'schema_version'")
+            current_version = 13
+
+        if current_version < 14:
+            print("Migrating to Schema v14: Index on recipes.folder_id...")
+            # Ordnerfilter der Rezeptliste; steps.recipe_id, ingredients.step_id und
+            # folders.parent_id sind schon über idx_steps_recipe_pos/idx_ing_step_pos/idx_folders_parent abgedeckt
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_recipes_folder ON recipes(folder_id)")
+            await db.execute("UPDATE db_metadata SET value = '14' WHERE key = 'schema_version'")
+            current_version = 14
+
+        if current_version < 15:
+            print("Migrating to Schema v15: Change counter for the index page ETag...")
+            # Steigt bei jedem Schreibzugriff auf recipes/folders (auch aus den tools/-Skripten);
+            # MAX(updated_at) hat nur Sekundenauflösung und verpasst mehrere Änderungen pro Sekunde
+            await db.execute("INSERT OR IGNORE INTO db_metadata (key, value) VALUES ('index_version', '0')")
+            await db.executescript(
+                """
+                CREATE TRIGGER IF NOT EXISTS index_version_recipes_ai AFTER INSERT ON recipes
+                BEGIN
+                    UPDATE db_metadata SET value = value + 1 WHERE key = 'index_version';
+                END;
+                CREATE TRIGGER IF NOT EXISTS index_version_recipes_au AFTER UPDATE ON recipes
+                BEGIN
+                    UPDATE db_metadata SET value = value + 1 WHERE key = 'index_version';
+                END;
+                CREATE TRIGGER IF NOT EXISTS index_version_recipes_ad AFTER DELETE ON recipes
+                BEGIN
+                    UPDATE db_metadata SET value = value + 1 WHERE key = 'index_version';
+                END;
+                CREATE TRIGGER IF NOT EXISTS index_version_folders_ai AFTER INSERT ON folders
+                BEGIN
+                    UPDATE db_metadata SET value = value + 1 WHERE key = 'index_version';
+                END;
+                CREATE TRIGGER IF NOT EXISTS index_version_folders_au AFTER UPDATE ON folders
+                BEGIN
+                    UPDATE db_metadata SET value = value + 1 WHERE key = 'index_version';
+                END;
+                CREATE TRIGGER IF NOT EXISTS index_version_folders_ad AFTER DELETE ON folders
+                BEGIN
+                    UPDATE db_metadata SET value = value + 1 WHERE key = 'index_version';
+                END;
+                """
+            )
+            await db.execute("UPDATE db_metadata SET value = '15' WHERE key = 'schema_version'")
+            current_version = 15
+
+        if current_version < 16:
+            print("Migrating to Schema v16: Change counter for units...")
+            # Wie index_version: die gecachten \DeclareSIUnit-Zeilen (routers/pdf.py) merken
+            # Änderungen an units auch aus tools/ oder anderen Prozessen
+            await db.execute("INSERT OR IGNORE INTO db_metadata (key, value) VALUES ('units_version', '0')")
+            await db.executescript(
+                """
+                CREATE TRIGGER IF NOT EXISTS units_version_ai AFTER INSERT ON units
+                BEGIN
+                    UPDATE db_metadata SET value = value + 1 WHERE key = 'units_version';
+                END;
+                CREATE TRIGGER IF NOT EXISTS units_version_au AFTER UPDATE ON units
+                BEGIN
+                    UPDATE db_metadata SET value = value + 1 WHERE key = 'units_version';
+                END;
+                CREATE TRIGGER IF NOT EXISTS units_version_ad AFTER DELETE ON units
+                BEGIN
+                    UPDATE db_metadata SET value = value + 1 WHERE key = 'units_version';
+                END;
+                """
+            )
+            await db.execute("UPDATE db_metadata SET value = '16' WHERE key = 'schema_version'")
+            current_version = 16
+
+        # Leftovers from writers that didn't flush (e.g. an aborted import)
+        await flush_fts(db)
+
         await db.commit()
         print(f"Database schema is up to date at version {current_version}.")
 
@@ -259,7 +482,7 @@ def get_config():
     config_path = os.path.join(base_dir, "config.yaml")
     
     with open(config_path, "r") as f:
-        full_config = yaml.safe_load(f)
+        full_config = yaml.load(f, Loader=YamlLoader)
     return {**full_config['common'], **full_config[env]}
 
 def get_db_path():
@@ -275,19 +498,129 @@ def get_db_path():
         
     return os.path.normpath(path)
 
+async def configure_connection(db: aiosqlite.Connection):
+    """Applies the per-connection PRAGMAs."""
+    for pragma in CONNECTION_PRAGMAS:
+        await db.execute(pragma)
+
+# Connection pool, opened/closed in the app lifespan. Every request gets a
+# connection of its own; one shared connection would mix up the
+# transactions of concurrent requests.
+DB_POOL_SIZE = 4
+# Longest wait for a pooled connection; then a temporary one is opened instead
+DB_POOL_TIMEOUT = 5  # seconds
+_pool = None
+_pool_connections = []
+
+async def _open_connection():
+    db = await aiosqlite.connect(get_db_path())
+    db.row_factory = aiosqlite.Row
+    await configure_connection(db)
+    return db
+
+async def open_db_pool(size: int = DB_POOL_SIZE):
+    global _pool
+    pool = asyncio.Queue()
+    for _ in range(size):
+        db = await _open_connection()
+        _pool_connections.append(db)
+        pool.put_nowait(db)
+    _pool = pool
+
+async def close_db_pool():
+    global _pool
+    _pool = None
+    for db in _pool_connections:
+        await db.close()
+    _pool_connections.clear()
+
+@asynccontextmanager
+async def _temporary_connection():
+    async with aiosqlite.connect(get_db_path()) as db:
+        db.row_factory = aiosqlite.Row
+        await configure_connection(db)
+        yield db
+
+@asynccontextmanager
+async def db_connection():
+    """
+    A connection from the pool, returned when the block ends. For handlers that
+    must not hold a connection for the whole request (e.g. the PDF build).
+    """
+    pool = _pool
+    if pool is None:
+        # Kein Pool (z.B. ohne lifespan): Verbindung pro Request
+        async with _temporary_connection() as db:
+            yield db
+        return
+
+    try:
+        db = await asyncio.wait_for(pool.get(), timeout=DB_POOL_TIMEOUT)
+    except asyncio.TimeoutError:
+        # Pool exhausted for too long: extra connection instead of blocking the request
+        async with _temporary_connection() as db:
+            yield db
+        return
+
+    try:
+        yield db
+    finally:
+        # Don't hand an unfinished transaction (e.g. after an exception) to the next request
+        if db.in_transaction:
+            await db.rollback()
+        pool.put_nowait(db)
+
 # Dependency for FastAPI routes
 async def get_db_connection():
-    db_path = get_db_path()
-    async with aiosqlite.connect(db_path) as db:
-        db.row_factory = aiosqlite.Row
+    async with db_connection() as db:
         yield db
 
+# Writers queue up here instead of colliding in SQLite (SQLITE_BUSY + busy_timeout waits)
+_write_lock = asyncio.Lock()
+
+@asynccontextmanager
+async def write_transaction(db: aiosqlite.Connection):
+    """
+    Explicit BEGIN IMMEDIATE ... COMMIT around a batch of writes: the write lock
+    is taken once up front instead of being upgraded mid-way, rolled back on errors.
+    Transactions of this process are serialized through _write_lock. Queued FTS
+    updates are flushed right before the commit.
+    """
+    async with _write_lock:
+        await db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+            await flush_fts(db)
+        except Exception:
+            await db.rollback()
+            raise
+        await db.commit()
+
+async def flush_fts(db: aiosqlite.Connection):
+    """Rebuilds the ingredients/steps FTS columns of the recipes queued in fts_dirty."""
+    await db.execute(FTS_FLUSH_SQL)
+    await db.execute(FTS_DIRTY_CLEAR_SQL)
+
 # User Context Helper
 async def get_user_context(request, db: aiosqlite.Connection):
     """
     Returns user context dict with username, display_name, role, and is_admin.
     Returns None values if user is not logged in or session is invalid/expired.
+    Memoized on request.state, so repeated calls within one request hit the DB once.
+    """
+    user_ctx = getattr(request.state, "user_ctx", None)
+    if user_ctx is None:
+        user_ctx = request.state.user_ctx = await _load_user_context(request, db)
+    return user_ctx
+
+async def current_user_context(request: Request, db: aiosqlite.Connection = Depends(get_db_connection)):
+    """
+    Dependency variant of get_user_context: `user_ctx: dict = Depends(current_user_context)`.
+    FastAPI resolves it once per request and shares the db connection with the handler.
     """
+    return await get_user_context(request, db)
+
+async def _load_user_context(request, db: aiosqlite.Connection):
     def _anon():
         return {
             "username": None,
@@ -303,15 +636,7 @@ async def get_user_context(request, db: aiosqlite.Connection):
 
     now = datetime.now(timezone.utc)
 
-    async with db.execute(
-        """
-        SELECT s.id, s.user_id, s.expires_at, s.last_seen, u.username, u.display_name, u.role, u.is_active
-        FROM sessions s
-        JOIN users u ON s.user_id = u.id
-        WHERE s.id = ?
-        """,
-        (session_id,),
-    ) as cursor:
+    async with db.execute(SESSION_LOOKUP_SQL, (session_id,)) as cursor:
         row = await cursor.fetchone()
 
     if not row:
@@ -321,12 +646,12 @@ async def get_user_context(request, db: aiosqlite.Connection):
         expires_at = datetime.fromisoformat(row["expires_at"])
         last_seen = datetime.fromisoformat(row["last_seen"])
     except Exception:
-        await db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+        await db.execute(SESSION_DELETE_SQL, (session_id,))
         await db.commit()
         return _anon()
 
     if expires_at <= now or not row["is_active"]:
-        await db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+        await db.execute(SESSION_DELETE_SQL, (session_id,))
         await db.commit()
         return _anon()
 
@@ -335,7 +660,7 @@ async def get_user_context(request, db: aiosqlite.Connection):
     if now - last_seen > timedelta(minutes=5):
         new_expiry = now + timedelta(days=7)
         await db.execute(
-            "UPDATE sessions SET last_seen = ?, expires_at = ? WHERE id = ?",
+            SESSION_TOUCH_SQL,
             (now.isoformat(), new_expiry.isoformat(), session_id)
         )
         await db.commit()
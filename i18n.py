@@ -1,4 +1,5 @@
 import os
+from functools import lru_cache
 from babel.support import Translations
 from babel.messages import pofile, mofile
 
@@ -35,7 +36,12 @@ def _ensure_compiled(locale: str) -> None:
 
 
 def get_translations() -> Translations:
-    locale = get_locale()
+    return _load_translations(get_locale())
+
+
+@lru_cache(maxsize=8)
+def _load_translations(locale: str) -> Translations:
+    """Compiled catalog per locale; loaded once and shared by the HTML and LaTeX templates"""
     _ensure_compiled(locale)
 
     try:
@@ -1,14 +1,15 @@
 # main.py
 import uvicorn
 import os
+import asyncio
 import subprocess
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
-from database import get_config, init_db
+from database import get_config, init_db, open_db_pool, close_db_pool
 from routers import recipes, pdf, auth, admin, oauth
-from template_config import templates
+from template_config import templates, precompile_templates
 from starlette.middleware.sessions import SessionMiddleware
 
 # Load config
@@ -47,7 +48,16 @@ templates.env.globals['git_version'] = git_version
 async def lifespan(app: FastAPI):
     # Alles hier drin wird beim Start ausgeführt
     await init_db() # Jetzt korrekt mit await!
+    await open_db_pool()
+    # Templates jetzt kompilieren statt beim ersten Request
+    precompile_templates()
+    # Fontcache im Hintergrund aufwärmen, blockiert den Start nicht
+    warm_up = asyncio.create_task(pdf.warm_up_latex())
     yield
+    warm_up.cancel()
+    # Wait for the task, so a running luaotfload-tool is killed before shutdown
+    await asyncio.gather(warm_up, return_exceptions=True)
+    await close_db_pool()
 
 
 # App setup
@@ -1,6 +1,8 @@
 # md.py
 import re
+import threading
 import markdown
+from functools import lru_cache
 
 # Central mapping of shortcuts to Phosphor hex codes
 EMOTICON_MAP = {
@@ -15,6 +17,35 @@ EMOTICON_MAP = {
     r'PP':    'E4D6', # Users, People
 }
 
+# Emoticon patterns compiled once, longest first so e.g. "(y)" wins over ":("
+_EMOTICON_PATTERNS = [
+    (re.compile(emo), code)
+    for emo, code in sorted(EMOTICON_MAP.items(), key=lambda kv: len(kv[0]), reverse=True)
+]
+
+# Compiled once at import (md_to_latex runs for every step of every PDF build)
+_LATEX_QTY_RE = re.compile(r'\[([^\]]+)\]')
+_LATEX_QUOTE_RE = re.compile(r'"([^"]+)"')
+_LATEX_BOLD_RE = re.compile(r'\*\*(.*?)\*\*')
+_LATEX_ITALIC_RE = re.compile(r'\*(.*?)\*')
+_LATEX_CELSIUS_RE = re.compile(r'(\d+)\s*°C')
+_LATEX_UNIT_SPACE_RE = re.compile(r'(\d+)\s+(kg|g|ml|l)')
+_LATEX_PARAGRAPH_RE = re.compile(r'\n\n+')
+_LATEX_NEWLINE_RE = re.compile(r'\n')
+_LATEX_SUPERSCRIPT_RE = re.compile(r'\^(.*?)\^')
+_LATEX_SUBSCRIPT_RE = re.compile(r'_(.*?)_')
+
+# One Markdown instance instead of markdown.markdown() per call, which sets up
+# the parser and loads the "extra" extensions every time (reset() between uses).
+# Per thread, since rendering may run in worker threads and Markdown is not thread-safe
+_markdown_local = threading.local()
+
+def _get_markdown():
+    md = getattr(_markdown_local, "md", None)
+    if md is None:
+        md = _markdown_local.md = markdown.Markdown(extensions=["extra"])
+    return md
+
 # Global cache for unit_map from DB (loaded on first use)
 _unit_map_cache = None
 
@@ -187,6 +218,11 @@ def format_ingredient_quantity(amount_min: float = None, amount_max: float = Non
     
     return ""
 
+@lru_cache(maxsize=4096)
+def format_ingredient_html(amount_min: float = None, amount_max: float = None, unit_symbol: str = None) -> str:
+    """HTML quantity for the recipe view, cached on the row values (unit_map is only used for LaTeX)"""
+    return format_ingredient_quantity(amount_min, amount_max, unit_symbol, format='html')
+
 def replace_quotes(text):
     """Convert standard quotes to appropriate format (enquote for LaTeX, guillemets for HTML)"""
     if not text: return ""
@@ -206,51 +242,52 @@ def md_to_latex(text, unit_map: dict = None):
         unit_map = {}
     
     # Parse and format quantities (before other replacements)
-    text = re.sub(r'\[([^\]]+)\]', lambda m: format_quantity(m.group(1), 'latex', unit_map), text)
+    text = _LATEX_QTY_RE.sub(lambda m: format_quantity(m.group(1), 'latex', unit_map), text)
     
     # Convert quotes to \enquote{} for language-aware formatting
-    text = re.sub(r'"([^"]+)"', r'\\enquote{\1}', text)
+    text = _LATEX_QUOTE_RE.sub(r'\\enquote{\1}', text)
 
     # Trim and basic cleanup
     text = text.strip().replace('\r\n', '\n')
 
-    for emo in sorted(EMOTICON_MAP.keys(), key=len, reverse=True):
-        code = EMOTICON_MAP[emo]
+    for emo_re, code in _EMOTICON_PATTERNS:
         # Using a regex with word boundaries or space checks to avoid 
         # accidental replacements inside URLs etc.
-        text = re.sub(emo, rf'\\picon{{{code}}}', text)
+        text = emo_re.sub(rf'\\picon{{{code}}}', text)
 
     # Basic Markdown (Bold, Italic, Units)
-    text = re.sub(r'\*\*(.*?)\*\*', r'\\textbf{\1}', text)
-    text = re.sub(r'\*(.*?)\*', r'\\textit{\1}', text)
+    text = _LATEX_BOLD_RE.sub(r'\\textbf{\1}', text)
+    text = _LATEX_ITALIC_RE.sub(r'\\textit{\1}', text)
 
     # Units & Dashes
-    text = re.sub(r'(\d+)\s*°C', r'\\qty{\1}{\\degreeCelsius}', text)
-    text = re.sub(r'(\d+)\s+(kg|g|ml|l)', r'\1\\,\2', text)
+    text = _LATEX_CELSIUS_RE.sub(r'\\qty{\1}{\\degreeCelsius}', text)
+    text = _LATEX_UNIT_SPACE_RE.sub(r'\1\\,\2', text)
     #text = re.sub(r'(?<!-)\s*--\s*(?!-)', '--', text) # Ensure standalone double-dash, without surrounding spaces
 
     # Handle Newlines
     # \addlinespace is great because you are already using booktabs
-    text = re.sub(r'\n\n+', r'\\addlinespace[0.5em] ', text)
+    text = _LATEX_PARAGRAPH_RE.sub(r'\\addlinespace[0.5em] ', text)
 
     # Convert single newlines
-    text = re.sub(r'\n', r'\\newline ', text)
+    text = _LATEX_NEWLINE_RE.sub(r'\\newline ', text)
 
     # Sub-/superscript
-    text = re.sub(r'\^(.*?)\^', r'\\textsuperscript{\1}', text)
-    text = re.sub(r'_(.*?)_', r'\\textsubscript{\1}', text)
+    text = _LATEX_SUPERSCRIPT_RE.sub(r'\\textsuperscript{\1}', text)
+    text = _LATEX_SUBSCRIPT_RE.sub(r'\\textsubscript{\1}', text)
     
     return text
 
 def md_to_html(text, unit_map: dict = None):
     """Convert markdown and emoticons to HTML icons and en-dashes"""
     if not text: return ""
-    
-    if unit_map is None:
-        unit_map = {}
-    
+    # HTML-Ausgabe hängt nur vom Text ab (unit_map wird nur für LaTeX gebraucht)
+    return _render_html(text)
+
+@lru_cache(maxsize=4096)
+def _render_html(text):
+    """Cached HTML rendering, keyed on the step text (changed text = new key)"""
     # Parse and format quantities (before other replacements)
-    text = re.sub(r'\[([^\]]+)\]', lambda m: format_quantity(m.group(1), 'html', unit_map), text)
+    text = re.sub(r'\[([^\]]+)\]', lambda m: format_quantity(m.group(1), 'html'), text)
 
     # Swiss Quotes
     text = replace_quotes(text)
@@ -261,10 +298,8 @@ def md_to_html(text, unit_map: dict = None):
     text = re.sub(r'(?<!-)--(?!-)', '&ndash;', text)
 
     # Emoticons to Hex-Entity
-    for emo in sorted(EMOTICON_MAP.keys(), key=len, reverse=True):
-        code = EMOTICON_MAP[emo]
-        # re.sub versteht die Escapes wie \) korrekt
-        text = re.sub(emo, f'<span class="ph-emo">&#x{code};</span>', text)
+    for emo_re, code in _EMOTICON_PATTERNS:
+        text = emo_re.sub(f'<span class="ph-emo">&#x{code};</span>', text)
 
     # Units
     text = re.sub(r'(\d+)\s+(kg|g|ml|l)', r'\1&#x202F;\2', text)
@@ -279,4 +314,8 @@ def md_to_html(text, unit_map: dict = None):
     text = re.sub(r'_(.*?)_', r'<sub>\1</sub>', text)
     text = re.sub(r'\^(.*?)\^', r'<sup>\1</sup>', text)
     # Standard Markdown
-    return markdown.markdown(text, extensions=["extra"])
+    return _get_markdown().reset().convert(text)
+
+def md_to_html_many(texts, unit_map: dict = None):
+    """md_to_html for a list of texts, e.g. all steps of a recipe in one worker-thread call"""
+    return [md_to_html(text, unit_map) for text in texts]
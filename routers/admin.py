@@ -191,11 +191,10 @@ async def manage_paths(request: Request, db: aiosqlite.Connection = Depends(get_
 
     # Alle Ordner holen
     async with db.execute("SELECT * FROM folders ORDER BY parent_id, name") as cursor:
-        rows = await cursor.fetchall()
-        folders = [dict(r) for r in rows]
+        folders = await cursor.fetchall()
 
     # Baum bauen (rekursiv oder per Referenz)
-    folder_dict = {f['id']: {**f, 'children': []} for f in folders}
+    folder_dict = {f['id']: dict(f, children=[]) for f in folders}
     root_nodes = []
     for f_id, f_data in folder_dict.items():
         if f_data['parent_id'] and f_data['parent_id'] in folder_dict:
@@ -206,7 +205,7 @@ async def manage_paths(request: Request, db: aiosqlite.Connection = Depends(get_
     return templates.TemplateResponse("admin_paths.html", {
         "request": request,
         "folder_tree": root_nodes,
-        "all_folders": folders, # Für Dropdowns beim Verschieben
+        "all_folders": folders, # Für Dropdowns beim Verschieben (Rows reichen dem Template)
         **user_ctx
     })
 
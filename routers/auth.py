@@ -5,12 +5,16 @@ from fastapi import APIRouter, Request, Depends, Form, HTTPException, status
 from fastapi.responses import HTMLResponse, RedirectResponse
 from passlib.context import CryptContext
 import aiosqlite
-from database import get_db_connection, get_config, get_user_context
+from database import get_db_connection, get_config, get_user_context, SESSION_DELETE_SQL
 from template_config import templates
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 SESSION_TTL = timedelta(days=7)
+SESSION_INSERT_SQL = """
+    INSERT INTO sessions (id, user_id, created_at, expires_at, last_seen, user_agent, ip_address)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
 
 def get_client_ip(request: Request) -> str:
     """Extract real client IP from proxy headers or fallback to direct connection."""
@@ -86,10 +90,7 @@ async def login(
     ip_address = get_client_ip(request)
 
     await db.execute(
-        """
-        INSERT INTO sessions (id, user_id, created_at, expires_at, last_seen, user_agent, ip_address)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-        """,
+        SESSION_INSERT_SQL,
         (
             session_id,
             user["id"],
@@ -125,7 +126,7 @@ async def logout(request: Request, db: aiosqlite.Connection = Depends(get_db_con
     response = RedirectResponse(url=redirect_url)
     session_id = request.cookies.get("rezepte_session_token")
     if session_id:
-        await db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+        await db.execute(SESSION_DELETE_SQL, (session_id,))
         await db.commit()
     response.delete_cookie("rezepte_session_token")
     response.delete_cookie("session_token")
@@ -11,10 +11,12 @@ import aiosqlite
 
 from database import get_db_connection, get_config, get_user_context
 from template_config import templates
-from routers.auth import pwd_context, SESSION_TTL, get_client_ip
+from routers.auth import pwd_context, SESSION_TTL, SESSION_INSERT_SQL, get_client_ip
 
 router = APIRouter(prefix="/auth/oauth", tags=["oauth"])
 
+OAUTH_LINK_LOOKUP_SQL = "SELECT user_id FROM oauth_links WHERE provider = ? AND subject = ?"
+
 # Initialize OAuth client
 oauth = OAuth()
 
@@ -104,10 +106,7 @@ async def oauth_callback(
             raise HTTPException(status_code=400, detail="No subject in userinfo")
         
         # Check if this OAuth account is already linked
-        async with db.execute(
-            "SELECT user_id FROM oauth_links WHERE provider = ? AND subject = ?",
-            ('authelia', oauth_sub)
-        ) as cursor:
+        async with db.execute(OAUTH_LINK_LOOKUP_SQL, ('authelia', oauth_sub)) as cursor:
             link = await cursor.fetchone()
         
         if link:
@@ -133,8 +132,7 @@ async def oauth_callback(
             expires = (datetime.now(timezone.utc) + SESSION_TTL).isoformat()
             
             await db.execute(
-                """INSERT INTO sessions (id, user_id, created_at, expires_at, last_seen, user_agent, ip_address)
-                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                SESSION_INSERT_SQL,
                 (session_id, user_id, now, expires, now,
                  request.headers.get("user-agent", "unknown"),
                  get_client_ip(request))
@@ -258,8 +256,7 @@ async def link_oauth_account(
     expires = (datetime.now(timezone.utc) + SESSION_TTL).isoformat()
     
     await db.execute(
-        """INSERT INTO sessions (id, user_id, created_at, expires_at, last_seen, user_agent, ip_address)
-           VALUES (?, ?, ?, ?, ?, ?, ?)""",
+        SESSION_INSERT_SQL,
         (session_id, user_id, now, expires, now,
          request.headers.get("user-agent", "unknown"),
          get_client_ip(request))
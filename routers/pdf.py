@@ -1,15 +1,19 @@
 import os
-import subprocess
+import re
+import asyncio
 import jinja2
-import tempfile
 import shutil
-from fastapi import APIRouter, HTTPException, Depends, Request
-from fastapi.responses import FileResponse
+import hashlib
+from collections import defaultdict
+from functools import lru_cache
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse, Response
 import aiosqlite
-from database import get_db_connection, get_config
+from database import db_connection, get_config
 from datetime import datetime
 from md import md_to_latex
 from i18n import get_locale, get_translations
+from template_config import JINJA_CACHE_DIR
 
 
 router = APIRouter()
@@ -18,10 +22,25 @@ config = get_config()
 # --- Path logic to go one level up from 'routers/' ---
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 FONT_PATH = os.path.join(BASE_DIR, "latex_templates", "ttf", "") # Trailing slash is important!
+CACHE_DIR = os.path.abspath(config['pdf_cache_dir'])
+LATEX_TIMEOUT = 60  # seconds per PDF build
+
+# Running builds per recipe_id; concurrent requests await the same build
+# (one at a time per recipe, they share the build directory)
+_build_futures = {}
+_BUILD_CANCELLED = object()
+
+# (units_version, unit definitions for the LaTeX preamble), see get_unit_defs
+_unit_defs_cache = None
+
+TEMPLATE_PATH = os.path.join("latex_templates", "master.tex")
+_template_mtime = None
 
 # LaTeX Jinja2 environment with custom delimiters
 latex_jinja_env = jinja2.Environment(
     loader=jinja2.FileSystemLoader('latex_templates'),
+    # Compiled templates survive restarts (same bytecode cache dir as the HTML templates)
+    bytecode_cache=jinja2.FileSystemBytecodeCache(JINJA_CACHE_DIR),
     block_start_string='<%',
     block_end_string='%>',
     variable_start_string='<<',
@@ -32,34 +51,323 @@ latex_jinja_env = jinja2.Environment(
     lstrip_blocks=True
 )
 
+async def warm_up_latex():
+    """
+    Baut beim Start den luaotfload-Fontcache auf, damit der erste PDF-Build
+    nicht die Font-Datenbank erzeugen muss (lualatex hat keinen Server-Modus).
+    """
+    tool = shutil.which("luaotfload-tool")
+    if not tool:
+        return
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            tool, "--update",
+            stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL
+        )
+    except OSError as e:
+        print(f"LaTeX warm-up failed: {e}")
+        return
+    try:
+        await proc.wait()
+    except asyncio.CancelledError:
+        # Shutdown während des Updates: Prozess nicht verwaist weiterlaufen lassen
+        proc.kill()
+        await proc.wait()
+        raise
+
+@lru_cache(maxsize=1)
+def _get_master():
+    """master.tex is compiled once per process"""
+    return latex_jinja_env.get_template('master.tex')
+
+def _get_template_mtime():
+    """
+    mtime of master.tex. Production uses the compiled template from _get_master(),
+    so one stat per process is enough; debug mode stats on every request.
+    """
+    global _template_mtime
+    if _template_mtime is None or config.get('debug', False):
+        try:
+            _template_mtime = os.path.getmtime(TEMPLATE_PATH)
+        except OSError:
+            _template_mtime = 0
+    return _template_mtime
+
+# siunitx/babel settings per UI language (default: German)
+LOCALE_SETTINGS = {
+    'en': {'siunitx_locale': 'US', 'babel_lang': 'english', 'siunitx_range_phrase': 'to'},
+    'fr': {'siunitx_locale': 'FR', 'babel_lang': 'french', 'siunitx_range_phrase': '--'},
+    'es': {'siunitx_locale': 'ES', 'babel_lang': 'spanish', 'siunitx_range_phrase': '--'},
+    'de': {'siunitx_locale': 'DE', 'babel_lang': 'ngerman', 'siunitx_range_phrase': '--'},
+}
+
+@lru_cache(maxsize=1)
+def _get_latex_labels():
+    """
+    Translated labels + locale settings. The language comes from config.yaml,
+    so this only has to be built (and the catalog loaded) once per process.
+    """
+    t = get_translations()
+    labels = {
+        'page_label': t.gettext('Seite'),
+        'date_label': t.gettext('Stand'),
+        'last_change_label': t.gettext('Letzte Änderung'),
+        'by_label': t.gettext('Von'),
+        'source_label': t.gettext('Quelle'),
+        'ingredients_label': t.gettext('Zutaten'),
+        'preparation_label': t.gettext('Zubereitung')
+    }
+    labels.update(LOCALE_SETTINGS.get(get_locale(), LOCALE_SETTINGS['de']))
+    return labels
+
+LATEX_REPLACEMENTS = {
+    '\\': r'\textbackslash{}', '{': r'\{', '}': r'\}', '%': r'\%',
+    '$': r'\$', '&': r'\&', '#': r'\#', '_': r'\_',
+    '^': r'\textasciicircum{}', '~': r'\textasciitilde{}'
+}
+# One pass over the text for all special characters
+LATEX_SPECIAL_RE = re.compile('|'.join(re.escape(c) for c in LATEX_REPLACEMENTS))
+
+@lru_cache(maxsize=4096)
 def escape_latex(text):
     """Escape special LaTeX characters"""
     if not text: return ""
-    replacements = {
-        '\\': r'\textbackslash{}', '{': r'\{', '}': r'\}', '%': r'\%',
-        '$': r'\$', '&': r'\&', '#': r'\#', '_': r'\_',
-        '^': r'\textasciicircum{}', '~': r'\textasciitilde{}'
-    }
-    for char, replacement in replacements.items():
-        text = text.replace(char, replacement)
-    return text
-
-@router.get("/recipe/{recipe_id}/pdf")
-async def get_pdf(
-    recipe_id: int, 
-    request: Request,
-    db: aiosqlite.Connection = Depends(get_db_connection)
-):
-    
-    # Fetch recipe data
-    async with db.execute("SELECT *, updated_at FROM recipes WHERE id = ?", (recipe_id,)) as cursor:
-        recipe = await cursor.fetchone()
+    return LATEX_SPECIAL_RE.sub(lambda m: LATEX_REPLACEMENTS[m.group()], text)
+
+@lru_cache(maxsize=4096)
+def latex_markdown(text):
+    """Escaped + converted Markdown, cached since texts repeat across rebuilds"""
+    return md_to_latex(escape_latex(text))
+
+def unit_cmd_name(raw):
+    """Letters of a unit symbol/code as LaTeX command name ("UnitX" if none are left)"""
+    return "".join(filter(str.isalpha, raw)) or "UnitX"
+
+def ingredient_unit_cmd(latex_code, symbol):
+    """Determine unit command for LaTeX"""
+    if latex_code:
+        # Case 1: Valid LaTeX code from database (e.g., \gram)
+        return latex_code
+    if symbol:
+        # Case 2: No LaTeX code, but symbol exists (e.g., "mg") -> create "\mg"
+        return f"\\{unit_cmd_name(symbol)}"
+    # Case 3: No unit at all (e.g., "3 Eggs")
+    # We use empty braces {} because siunitx requires a second argument
+    return "{}"
+
+async def get_unit_defs(db: aiosqlite.Connection):
+    """
+    \\DeclareSIUnit lines for the custom (non-SI) units. Cached until units_version
+    changes (bumped by triggers on units, schema v16, also for edits from tools/).
+    """
+    global _unit_defs_cache
+    async with db.execute("SELECT value FROM db_metadata WHERE key = 'units_version'") as cursor:
+        version = (await cursor.fetchone())[0]
+    if _unit_defs_cache is None or _unit_defs_cache[0] != version:
+        # Fetch custom unit definitions
+        async with db.execute("SELECT symbol, latex_code FROM units WHERE type != 'si'") as cursor:
+            custom_units = await cursor.fetchall()
+
+        _unit_defs_cache = (version, "".join(
+            f"\\DeclareSIUnit\\{unit_cmd_name(u['latex_code'] or u['symbol'])}{{{u['symbol']}}}\n"
+            for u in custom_units
+        ))
+    return _unit_defs_cache[1]
+
+def etag_headers(etag):
+    return {"ETag": etag, "Cache-Control": "private, max-age=0, must-revalidate"}
+
+def etag_matches(request: Request, etag):
+    if_none_match = request.headers.get("if-none-match")
+    return bool(if_none_match) and etag in [tag.strip() for tag in if_none_match.split(",")]
+
+async def load_pdf_content(db: aiosqlite.Connection, recipe_id: int):
+    """Everything build_pdf needs from the DB besides the recipe row: (unit_defs, steps_data)"""
+    unit_defs = await get_unit_defs(db)
+
+    # Fetch steps with category metadata
+    query_steps = """
+        SELECT s.*, c.codepoint, c.is_ingredients 
+        FROM steps s
+        LEFT JOIN step_categories c ON s.category_id = c.id
+        WHERE s.recipe_id = ? 
+        ORDER BY s.position
+    """
+    async with db.execute(query_steps, (recipe_id,)) as cursor:
+        steps_raw = await cursor.fetchall()
+
+    # All ingredients of the recipe in one query, bucketed per step.
+    # master.tex only prints them for is_ingredients steps, so only those are fetched.
+    query_ing = """
+        SELECT i.step_id, i.amount_min, i.amount_max, i.item, i.note, u.symbol, u.latex_code
+        FROM ingredients i 
+        JOIN steps s ON i.step_id = s.id
+        JOIN step_categories c ON s.category_id = c.id
+        LEFT JOIN units u ON i.unit_id = u.id 
+        WHERE s.recipe_id = ? AND c.is_ingredients = 1
+        ORDER BY i.position
+    """
+    ingredients_by_step = defaultdict(list)
+    async with db.execute(query_ing, (recipe_id,)) as i_cursor:
+        async for ing in i_cursor:
+            note = ing['note']
+            # Only the fields master.tex uses, built in one go
+            ingredients_by_step[ing['step_id']].append({
+                # Format amounts (strip trailing zeros)
+                'amount_min': f"{ing['amount_min']:g}" if ing['amount_min'] is not None else None,
+                'amount_max': f"{ing['amount_max']:g}" if ing['amount_max'] is not None else None,
+                'item': escape_latex(ing['item']),
+                # Filter out None/empty notes
+                'note': escape_latex(note) if note and note != 'None' and note.strip() else None,
+                'unit_cmd': ingredient_unit_cmd(ing['latex_code'], ing['symbol']),
+            })
+
+    steps_data = []
+    for step in steps_raw:
+        s_dict = dict(step)
+        s_dict['latex_text'] = latex_markdown(s_dict['markdown_text'])
+
+        # Convert icon codepoint to integer
+        if s_dict['codepoint']:
+             s_dict['latex_icon'] = int(s_dict['codepoint'], 16)
+        else:
+             s_dict['latex_icon'] = None
+
+        s_dict["ingredients"] = ingredients_by_step[step["id"]]
+        steps_data.append(s_dict)
+
+    return unit_defs, steps_data
+
+async def build_pdf(recipe, unit_defs, steps_data, request: Request, target_pdf_path: str, debug_dir: str):
+    """
+    Renders master.tex for the recipe and compiles it to target_pdf_path.
+    Needs no DB connection: lualatex can take up to LATEX_TIMEOUT.
+    """
+    recipe_id = recipe['id']
+    print(f"--> Building PDF for Recipe {recipe_id} ({recipe['name']})...")
+
+    # Format metadata dates
+    try:
+        dt_update = datetime.strptime(recipe['updated_at'], "%Y-%m-%d %H:%M:%S")
+        fmt_version_date = dt_update.strftime("%d.%m.%Y")
+    except:
+        fmt_version_date = "Unknown"
+
+    fmt_print_date = datetime.now().strftime("%d.%m.%Y")
+
+    # Escape optional fields
+    src_text = escape_latex(recipe['source']) if recipe['source'] else None
+    preamble_text = latex_markdown(recipe['preamble']) if recipe['preamble'] else None
+
+    # get base URL
+    base_url = str(request.base_url).rstrip('/')
+
+    # Language-specific labels and siunitx/babel settings
+    labels = _get_latex_labels()
+
+    # Render LaTeX template
+    # In debug mode pick up template edits without a restart
+    if config.get('debug', False):
+        template = latex_jinja_env.get_template('master.tex')
+    else:
+        template = _get_master()
+    tex_stream = template.stream(
+        recipe=recipe,
+        preamble=preamble_text,
+        steps=steps_data,
+        unit_defs=unit_defs,
+        date_version=fmt_version_date,
+        date_print=fmt_print_date,
+        font_path=FONT_PATH,
+        base_url=escape_latex(base_url),
+        source=src_text,
+        **labels  # Unpack language labels
+    )
+
+    # Build in a persistent per-recipe directory inside the cache: latexmk finds
+    # the .aux/.fls of the previous run, and the PDF can be moved into place
+    build_dir = os.path.join(CACHE_DIR, "build", str(recipe_id))
+    os.makedirs(build_dir, exist_ok=True)
+    # Leftover from an earlier failed run must not count as success
+    built_pdf = os.path.join(build_dir, "recipe.pdf")
+    if os.path.exists(built_pdf):
+        os.remove(built_pdf)
+
+    tex_path = os.path.join(build_dir, "recipe.tex")
+    # Write chunks while rendering instead of building the whole string first,
+    # in a worker thread so the event loop is not blocked by render + write
+    tex_stream.enable_buffering(16)
+    await asyncio.to_thread(tex_stream.dump, tex_path, encoding="utf-8")
+
+    # Save .tex file for debugging if enabled (hardlink, copy only across filesystems)
+    if config.get('debug', False):
+        os.makedirs(debug_dir, exist_ok=True)
+        debug_tex = os.path.join(debug_dir, f"{recipe_id}.tex")
+        try:
+            if os.path.exists(debug_tex):
+                os.remove(debug_tex)
+            os.link(tex_path, debug_tex)
+        except OSError:
+            shutil.copy2(tex_path, debug_tex)
+
+    if config.get('debug', False):
+        # Compile with latexmk (reruns until stable, handy while editing the template)
+        cmd = [
+            "latexmk", "-pdf", "-lualatex", "-interaction=nonstopmode",
+            f"-output-directory={build_dir}", tex_path
+        ]
+    else:
+        # master.tex has no refs/TOC/citations and fixed column widths,
+        # a single lualatex run is enough
+        cmd = [
+            "lualatex", "--interaction=nonstopmode",
+            f"--output-directory={build_dir}", tex_path
+        ]
+    env = os.environ.copy()
+    env['LC_ALL'] = 'C.UTF-8'
+    env['LANG'] = 'C.UTF-8'
+
+    # Run without blocking the event loop; a hanging build gets killed
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE, env=env
+    )
+    try:
+        _, stderr = await asyncio.wait_for(proc.communicate(), timeout=LATEX_TIMEOUT)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        stderr = f"Timeout after {LATEX_TIMEOUT}s".encode()
+    except asyncio.CancelledError:
+        # Client gone or shutdown: lualatex must not keep writing into the build dir
+        proc.kill()
+        await proc.wait()
+        raise
+
+    if not os.path.exists(built_pdf):
+        print(f"LaTeX Error:\n{stderr.decode()}")
+        if config.get('debug', False):
+            try: shutil.copy2(os.path.join(build_dir, "recipe.log"), os.path.join(debug_dir, f"{recipe_id}.log"))
+            except: pass
+        raise HTTPException(status_code=500, detail="PDF Generation failed.")
+
+    # Atomic rename: readers never see a half-written PDF
+    os.replace(built_pdf, target_pdf_path)
+
+# HEAD goes through the same ETag check (FileResponse only sends the headers)
+@router.api_route("/recipe/{recipe_id}/pdf", methods=["GET", "HEAD"])
+async def get_pdf(recipe_id: int, request: Request):
+    # Connections are only held for the reads, not while a build runs or is awaited
+    # (lualatex can take up to LATEX_TIMEOUT): PDF requests must not drain the pool
+    async with db_connection() as db:
+        # Fetch recipe data
+        async with db.execute("SELECT *, updated_at FROM recipes WHERE id = ?", (recipe_id,)) as cursor:
+            recipe = await cursor.fetchone()
     
     if not recipe:
         raise HTTPException(status_code=404, detail="Recipe not found")
 
     # Setup cache paths
-    cache_dir = os.path.abspath(config['pdf_cache_dir'])
+    cache_dir = CACHE_DIR
     pdf_dir = os.path.join(cache_dir, "pdf")
     debug_dir = os.path.join(cache_dir, "debug")
     os.makedirs(pdf_dir, exist_ok=True)
@@ -70,205 +378,60 @@ async def get_pdf(
     safe_name = recipe['name'].replace(" ", "_").replace("/", "-").replace("\\", "-")
     download_filename = f"{safe_name}.pdf"
 
+    template_mtime = _get_template_mtime()
+
+    # ETag from recipe and template version: unchanged PDFs are answered with 304
+    etag_src = f"{recipe_id}:{recipe['updated_at']}:{template_mtime}"
+    etag = f'"{hashlib.blake2b(etag_src.encode(), digest_size=8).hexdigest()}"'
+    cache_headers = etag_headers(etag)
+    if etag_matches(request, etag) and os.path.exists(target_pdf_path):
+        return Response(status_code=304, headers=cache_headers)
+
     # Check if PDF needs rebuild (compare timestamps)
     needs_rebuild = True
     if os.path.exists(target_pdf_path):
         pdf_mtime = os.path.getmtime(target_pdf_path)
         try:
             db_mtime = datetime.strptime(recipe['updated_at'], "%Y-%m-%d %H:%M:%S").timestamp()
-            template_path = os.path.join("latex_templates", "master.tex")
-            template_mtime = os.path.getmtime(template_path)
             
             if (db_mtime < pdf_mtime) and (template_mtime < pdf_mtime):
                 needs_rebuild = False
         except Exception:
             needs_rebuild = True
 
-    if needs_rebuild:
-        print(f"--> Building PDF for Recipe {recipe_id} ({recipe['name']})...")
-
-        # Fetch custom unit definitions
-        async with db.execute("SELECT symbol, latex_code FROM units WHERE type != 'si'") as cursor:
-            custom_units = await cursor.fetchall()
-        
-        unit_defs = ""
-        for u in custom_units:
-            raw_code = u['latex_code'] if u['latex_code'] else u['symbol']
-            cmd_name = "".join([c for c in raw_code if c.isalpha()])
-            if not cmd_name: cmd_name = "UnitX"
-            unit_defs += f"\\DeclareSIUnit\\{cmd_name}{{{u['symbol']}}}\n"
-
-        # Fetch steps with category metadata
-        query_steps = """
-            SELECT s.*, c.codepoint, c.is_ingredients 
-            FROM steps s
-            LEFT JOIN step_categories c ON s.category_id = c.id
-            WHERE s.recipe_id = ? 
-            ORDER BY s.position
-        """
-        async with db.execute(query_steps, (recipe_id,)) as cursor:
-            steps_raw = await cursor.fetchall()
-        
-        steps_data = []
-        for step in steps_raw:
-            s_dict = dict(step)
-            s_dict['latex_text'] = md_to_latex(escape_latex(s_dict['markdown_text']))
-
-            # Convert icon codepoint to integer
-            if s_dict['codepoint']:
-                 s_dict['latex_icon'] = int(s_dict['codepoint'], 16)
-            else:
-                 s_dict['latex_icon'] = None
-
-            # Fetch ingredients
-            query_ing = """
-                SELECT i.*, u.symbol, u.latex_code
-                FROM ingredients i 
-                LEFT JOIN units u ON i.unit_id = u.id 
-                WHERE step_id = ? ORDER BY i.position
-            """
-            async with db.execute(query_ing, (step["id"],)) as i_cursor:
-                ing_rows = await i_cursor.fetchall()
-                ingredients = []
-                for ing in ing_rows:
-                    i = dict(ing)
-                    
-                    # Format amounts (strip trailing zeros)
-                    if i['amount_min'] is not None: i['amount_min'] = f"{i['amount_min']:g}"
-                    if i['amount_max'] is not None: i['amount_max'] = f"{i['amount_max']:g}"
-                    
-                    i['item'] = escape_latex(i['item'])
-                    # Filter out None/empty notes
-                    if i['note'] and i['note'] != 'None' and i['note'].strip():
-                        i['note'] = escape_latex(i['note'])
-                    else:
-                        i['note'] = None
-                    
-                    # Determine unit command for LaTeX
-                    if i['latex_code']:
-                        # Case 1: Valid LaTeX code from database (e.g., \gram)
-                        i['unit_cmd'] = i['latex_code']
-                    elif i['symbol']:
-                        # Case 2: No LaTeX code, but symbol exists (e.g., "mg") -> create "\mg"
-                        clean_sym = "".join([c for c in i['symbol'] if c.isalpha()])
-                        if not clean_sym: 
-                            clean_sym = "UnitX" # Fallback for non-alphabetic symbols
-                        i['unit_cmd'] = f"\\{clean_sym}"
-                    else:
-                        # Case 3: No unit at all (e.g., "3 Eggs")
-                        # We use empty braces {} because siunitx requires a second argument
-                        i['unit_cmd'] = "{}"
-
-                    ingredients.append(i)
-                s_dict["ingredients"] = ingredients
-            steps_data.append(s_dict)
-
-        # Format metadata dates
-        try:
-            dt_update = datetime.strptime(recipe['updated_at'], "%Y-%m-%d %H:%M:%S")
-            fmt_version_date = dt_update.strftime("%d.%m.%Y")
-        except:
-            fmt_version_date = "Unknown"
-            
-        fmt_print_date = datetime.now().strftime("%d.%m.%Y")
-        
-        # Escape optional fields
-        src_text = escape_latex(recipe['source']) if recipe['source'] else None
-        preamble_text = md_to_latex(escape_latex(recipe['preamble'])) if recipe['preamble'] else None
-
-        # get base URL
-        base_url = str(request.base_url).rstrip('/')
-        
-        # Get locale and setup language-specific labels
-        locale = get_locale()
-        t = get_translations()
-        labels = {
-            'page_label': t.gettext('Seite'),
-            'date_label': t.gettext('Stand'),
-            'last_change_label': t.gettext('Letzte Änderung'),
-            'by_label': t.gettext('Von'),
-            'source_label': t.gettext('Quelle'),
-            'ingredients_label': t.gettext('Zutaten'),
-            'preparation_label': t.gettext('Zubereitung')
-        }
-
-        if locale == 'en':
-            locale_settings = {
-                'siunitx_locale': 'US',
-                'babel_lang': 'english',
-                'siunitx_range_phrase': 'to'
-            }
-        elif locale == 'fr':
-            locale_settings = {
-                'siunitx_locale': 'FR',
-                'babel_lang': 'french',
-                'siunitx_range_phrase': '--'
-            }
-        elif locale == 'es':
-            locale_settings = {
-                'siunitx_locale': 'ES',
-                'babel_lang': 'spanish',
-                'siunitx_range_phrase': '--'
-            }
-        else:  # default German
-            locale_settings = {
-                'siunitx_locale': 'DE',
-                'babel_lang': 'ngerman',
-                'siunitx_range_phrase': '--'
-            }
-
-        labels.update(locale_settings)
-
-        # Render LaTeX template
-        template = latex_jinja_env.get_template('master.tex')
-        tex_content = template.render(
-            recipe=recipe,
-            preamble=preamble_text,
-            steps=steps_data,
-            unit_defs=unit_defs,
-            date_version=fmt_version_date,
-            date_print=fmt_print_date,
-            font_path=FONT_PATH,
-            base_url=escape_latex(base_url),
-            source=src_text,
-            **labels  # Unpack language labels
-        )
-
-        # Build PDF in temporary directory
-        with tempfile.TemporaryDirectory() as temp_dir:
-            tex_path = os.path.join(temp_dir, "recipe.tex")
-            with open(tex_path, "w") as f:
-                f.write(tex_content)
-            
-            # Save .tex file for debugging if enabled
-            if config.get('debug', False):
-                os.makedirs(debug_dir, exist_ok=True)
-                shutil.copy2(tex_path, os.path.join(debug_dir, f"{recipe_id}.tex"))
-
-            # Compile with latexmk
-            cmd = [
-                "latexmk", "-pdf", "-lualatex", "-interaction=nonstopmode",
-                f"-output-directory={temp_dir}", tex_path
-            ]
-            env = os.environ.copy()
-            env['LC_ALL'] = 'C.UTF-8'
-            env['LANG'] = 'C.UTF-8'
-            
-            result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
-            
-            temp_pdf = os.path.join(temp_dir, "recipe.pdf")
-            if not os.path.exists(temp_pdf):
-                print(f"LaTeX Error:\n{result.stderr.decode()}")
-                if config.get('debug', False):
-                    try: shutil.copy2(os.path.join(temp_dir, "recipe.log"), os.path.join(debug_dir, f"{recipe_id}.log"))
-                    except: pass
+    while needs_rebuild:
+        pending = _build_futures.get(recipe_id)
+        if pending is not None:
+            # Same recipe is already being built: wait for that build instead of compiling twice
+            built_from = await asyncio.shield(pending)
+            if built_from is False:
                 raise HTTPException(status_code=500, detail="PDF Generation failed.")
-                
-            shutil.copy2(temp_pdf, target_pdf_path)
+            # That build may have started from an older version of the recipe:
+            # only use it if it matches the updated_at this ETag is built from
+            needs_rebuild = built_from != recipe['updated_at']
+            continue
+        pending = asyncio.get_running_loop().create_future()
+        _build_futures[recipe_id] = pending
+        # Result: updated_at of the recipe version in the PDF, False on failure
+        built_from = False
+        try:
+            async with db_connection() as db:
+                unit_defs, steps_data = await load_pdf_content(db, recipe_id)
+            await build_pdf(recipe, unit_defs, steps_data, request, target_pdf_path, debug_dir)
+            built_from = recipe['updated_at']
+        except asyncio.CancelledError:
+            # This request was cancelled, not the build failed: waiters build themselves
+            built_from = _BUILD_CANCELLED
+            raise
+        finally:
+            _build_futures.pop(recipe_id, None)
+            pending.set_result(built_from)
+        needs_rebuild = False
 
     return FileResponse(
         target_pdf_path, 
         media_type='application/pdf', 
         content_disposition_type='inline',
-        filename=download_filename 
-    )
\ No newline at end of file
+        filename=download_filename,
+        headers=cache_headers
+    )
@@ -1,12 +1,21 @@
 from fastapi import APIRouter, Request, HTTPException, Depends
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, Response
 import aiosqlite
+import asyncio
+import hashlib
+import json
+import logging
 import re
-from database import get_db_connection, get_user_context
+import secrets
+from collections import defaultdict
+from itertools import chain
+from database import get_db_connection, current_user_context, write_transaction
 from template_config import templates
 from md import EMOTICON_MAP
+from routers.pdf import etag_headers, etag_matches
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 # Mapping von deutschen zu englischen Spaltennamen für FTS-Suche
 FTS_COLUMN_MAPPING = {
@@ -28,6 +37,9 @@ FTS_COLUMN_MAPPING = {
     'preamble': 'preamble',
     'einleitung': 'preamble',
 }
+_FTS_VALID_COLUMNS = ', '.join(sorted(set(FTS_COLUMN_MAPPING.values())))
+# Spaltenpräfix (Wort + Doppelpunkt), z.B. "zutat: krisch"
+_FTS_PREFIX_RE = re.compile(r'^(\w+):\s*(.+)$')
 
 def transform_search_query(q: str) -> tuple:
     """
@@ -44,7 +56,7 @@ def transform_search_query(q: str) -> tuple:
         error_message is None if no error, otherwise contains hint
     """
     # Check for column prefix pattern (word + colon)
-    match = re.match(r'^(\w+):\s*(.+)$', q.strip())
+    match = _FTS_PREFIX_RE.match(q.strip())
     if match:
         column_name, search_term = match.groups()
         column_lower = column_name.lower()
@@ -55,12 +67,21 @@ def transform_search_query(q: str) -> tuple:
             return f"{mapped_column}: {search_term}", None
         else:
             # Invalid column
-            valid_columns = ', '.join(sorted(set(FTS_COLUMN_MAPPING.values())))
-            error = f"Unbekannte Spalte '{column_name}'. Verfügbar: {valid_columns}"
+            error = f"Unbekannte Spalte '{column_name}'. Verfügbar: {_FTS_VALID_COLUMNS}"
             return q, error
     
     return q, None
 
+# "[-]min[-max]" nach Komma->Punkt; führende Bindestriche sind Aufzählungszeichen,
+# alles nach einem zweiten Bindestrich wird (wie bisher beim split) ignoriert.
+# Die Lookaheads nehmen führende Leerzeichen/Bindestriche wie strip/lstrip komplett
+# (kein Backtracking in den Bereich). Zahlen: was float() ohne Minus annimmt
+# ("+2", "1e3", "1_000", "inf"); ein Minus kam auch früher nie bei float() an
+_AMOUNT_DIGITS = r'\d(?:_?\d)*'
+_AMOUNT_NUM = (rf'(\+?(?:(?:{_AMOUNT_DIGITS}(?:\.(?:{_AMOUNT_DIGITS})?)?|\.{_AMOUNT_DIGITS})'
+               rf'(?:e\+?{_AMOUNT_DIGITS})?|inf(?:inity)?|nan))')
+_AMOUNT_RE = re.compile(rf'^\s*(?!\s)-*(?!-)\s*{_AMOUNT_NUM}?\s*(?:-\s*{_AMOUNT_NUM}?\s*(?:-.*)?)?$', re.S | re.I)
+
 def parse_amount(amount_str: str):
     """
     Parse amount strings like '300', '300-400', or '- 450' into min/max values.
@@ -69,69 +90,148 @@ def parse_amount(amount_str: str):
     if not amount_str:
         return None, None
     
-    # Normalize: comma to dot, trim whitespace
-    s = amount_str.replace(',', '.').strip()
-    
-    # Remove leading hyphens (list bullet markers)
-    # Converts "-450" or "- 450" to "450"
-    if s.startswith('-'):
-        s = s.lstrip('-').strip()
-
-    # Check for range (hyphen in the middle)
-    if '-' in s:
-        parts = s.split('-')
-        try:
-            val_min = float(parts[0].strip()) if parts[0].strip() else None
-            val_max = float(parts[1].strip()) if parts[1].strip() else None
-            return val_min, val_max
-        except ValueError:
-            return None, None
-            
-    # Single value
-    try:
-        return float(s), None
-    except ValueError:
+    m = _AMOUNT_RE.match(amount_str.replace(',', '.'))
+    if not m:
         return None, None
+    val_min, val_max = m.groups()
+    return (float(val_min) if val_min else None,
+            float(val_max) if val_max else None)
+
+# steps[i][feld] bzw. steps[i][ingredients][j][feld]
+_FORM_KEY_RE = re.compile(r'steps\[(\d+)\](?:\[ingredients\]\[(\d+)\])?\[(\w+)\]$')
+
+def parse_steps_form(form):
+    """
+    Bucket the step/ingredient form fields in one pass over the form.
+    Returns [(step_fields, [ingredient_fields, ...]), ...] in form order; like the
+    old probing loops, steps end at the first index without [position] and
+    ingredients at the first index without [item].
+    """
+    buckets = defaultdict(lambda: ({}, defaultdict(dict)))
+    for key, value in form.multi_items():
+        m = _FORM_KEY_RE.match(key)
+        if not m:
+            continue
+        step_idx, ing_idx, field = m.groups()
+        fields, ings = buckets[int(step_idx)]
+        if ing_idx is None:
+            fields[field] = value
+        else:
+            ings[int(ing_idx)][field] = value
+
+    steps = []
+    step_idx = 0
+    while step_idx in buckets and "position" in buckets[step_idx][0]:
+        fields, ings = buckets[step_idx]
+        ing_list = []
+        ing_idx = 0
+        while ing_idx in ings and "item" in ings[ing_idx]:
+            ing_list.append(ings[ing_idx])
+            ing_idx += 1
+        steps.append((fields, ing_list))
+        step_idx += 1
+    return steps
+
+# Parameterlimit pro Statement: 999 bis SQLite 3.32, danach 32766 - das kleinere gilt
+SQLITE_MAX_VARIABLES = 999
+
+async def insert_values(db, sql_head, rows, returning_id=False):
+    """
+    INSERT with one multi-row VALUES list per chunk instead of one statement per row.
+    With returning_id the new ids come back in insert order (AUTOINCREMENT ids only
+    grow, RETURNING itself does not guarantee an order, hence the sort).
+    """
+    new_ids = []
+    if not rows:
+        return new_ids
+    row_marks = "(" + ",".join("?" * len(rows[0])) + ")"
+    chunk_rows = max(1, SQLITE_MAX_VARIABLES // len(rows[0]))
+    for start in range(0, len(rows), chunk_rows):
+        chunk = rows[start:start + chunk_rows]
+        sql = f"{sql_head} VALUES {','.join([row_marks] * len(chunk))}"
+        params = list(chain.from_iterable(chunk))
+        if returning_id:
+            id_rows = await db.execute_fetchall(sql + " RETURNING id", params)
+            new_ids.extend(sorted(r[0] for r in id_rows))
+        else:
+            await db.execute(sql, params)
+    return new_ids
 
 async def get_breadcrumbs(db, folder_id):
-    """Berechnet rekursiv den Pfad für die Breadcrumbs"""
+    """Berechnet den Pfad für die Breadcrumbs aus dem gecachten Ordnerbaum"""
+    _, folder_dict = await _get_folders(db)
     breadcrumbs = []
     current_id = folder_id
-    while current_id:
-        async with db.execute("SELECT id, name, parent_id FROM folders WHERE id = ?", (current_id,)) as cursor:
-            folder = await cursor.fetchone()
-            if folder:
-                breadcrumbs.insert(0, dict(folder))
-                current_id = folder['parent_id']
-            else:
-                break
+    # Längenbegrenzung nur als Schutz gegen Zyklen in parent_id
+    while current_id in folder_dict and len(breadcrumbs) <= len(folder_dict):
+        folder = folder_dict[current_id]
+        breadcrumbs.append({"id": folder["id"], "name": folder["name"], "parent_id": folder["parent_id"]})
+        current_id = folder["parent_id"]
+    breadcrumbs.reverse()
     return breadcrumbs
 
+# Ordner-ID (Parameter) plus alle Unterordner; UNION statt UNION ALL bricht auch bei Zyklen ab.
+# Fester SQL-Text, auch direkt als "folder_id IN (...)"-Subquery verwendbar
+FOLDER_SUBTREE_SQL = """
+    WITH RECURSIVE sub(id) AS (
+        VALUES(?)
+        UNION
+        SELECT f.id FROM folders f JOIN sub ON f.parent_id = sub.id
+    )
+    SELECT id FROM sub
+"""
+
 async def get_all_child_folder_ids(db, folder_id):
     """Gibt eine Liste aller Unterordner-IDs inklusive der eigenen ID zurück."""
-    ids = [folder_id]
-    async with db.execute("SELECT id FROM folders WHERE parent_id = ?", (folder_id,)) as cursor:
-        rows = await cursor.fetchall()
-        for row in rows:
-            child_ids = await get_all_child_folder_ids(db, row['id'])
-            ids.extend(child_ids)
-    return ids
+    async with db.execute(FOLDER_SUBTREE_SQL, (folder_id,)) as cursor:
+        return [row[0] for row in await cursor.fetchall()]
+
+# (index_version, Ordnerbaum, Ordner nach ID). index_version steigt per Trigger bei jeder
+# Änderung an folders, auch durch tools/ oder andere Prozesse (siehe INDEX_FINGERPRINT_SQL)
+_folder_cache = None
+
+async def _get_folders(db):
+    global _folder_cache
+    async with db.execute(INDEX_FINGERPRINT_SQL) as cursor:
+        version = (await cursor.fetchone())[0]
+    if _folder_cache is None or _folder_cache[0] != version:
+        async with db.execute("SELECT * FROM folders ORDER BY parent_id, name") as cursor:
+            rows = await cursor.fetchall()
+
+        # Eine Kopie pro Ordner (Row -> dict mit children), nicht zwei
+        folder_dict = {r['id']: dict(r, children=[]) for r in rows}
+        folder_tree = []
+        for f_id, f_data in folder_dict.items():
+            if f_data['parent_id'] and f_data['parent_id'] in folder_dict:
+                folder_dict[f_data['parent_id']]['children'].append(f_data)
+            else:
+                folder_tree.append(f_data)
+        _folder_cache = (version, folder_tree, folder_dict)
+    return _folder_cache[1:]
 
 async def get_folder_tree(db):
-    """Baue den Ordnerbaum für die Navigation"""
-    async with db.execute("SELECT * FROM folders ORDER BY parent_id, name") as cursor:
-        rows = await cursor.fetchall()
-        folders = [dict(r) for r in rows]
-
-    folder_dict = {f['id']: {**f, 'children': []} for f in folders}
-    folder_tree = []
-    for f_id, f_data in folder_dict.items():
-        if f_data['parent_id'] and f_data['parent_id'] in folder_dict:
-            folder_dict[f_data['parent_id']]['children'].append(f_data)
-        else:
-            folder_tree.append(f_data)
+    """Baue den Ordnerbaum für die Navigation (gecacht, nicht verändern)"""
+    folder_tree, _ = await _get_folders(db)
     return folder_tree
 
+async def get_editor_choices(db):
+    """Kategorien und Einheiten für den Editor in einer einzigen Abfrage"""
+    rows = await db.execute_fetchall("""
+        SELECT 'cat' AS kind, id, label_de AS label, label_de AS sort_key FROM step_categories
+        WHERE is_ingredients = 0 AND id > 1
+        UNION ALL
+        SELECT 'unit', id, symbol, name FROM units
+        ORDER BY kind, sort_key
+    """)
+    categories = []
+    units = []
+    for r in rows:
+        if r["kind"] == "cat":
+            categories.append({"id": r["id"], "label_de": r["label"]})
+        else:
+            units.append({"id": r["id"], "symbol": r["label"]})
+    return categories, units
+
 @router.get("/api/help", response_class=JSONResponse)
 async def get_help_data():
     """API endpoint for editor help - returns syntax guide and emoticons"""
@@ -167,18 +267,43 @@ async def get_help_data():
         "emoticons": emoticons
     }
     
+# Only what index.html shows; keeps preambles etc. out of the materialized list
+INDEX_COLUMNS = "id, name, author, owner_id"
+
+# bm25 column weights in recipe_fts column order: name, author, source, preamble, ingredients, steps
+FTS_RANK = "bm25(5.0, 3.0, 2.5, 2.0, 1.5, 1.0)"
+# Einträge pro Seite (Liste und Suche); eine Zeile mehr wird geholt, um eine Folgeseite zu erkennen
+PAGE_SIZE = 50
+
+# Fingerprint of everything the index page lists: a counter that triggers bump on
+# every write to recipes and folders (schema v15), exact even for several edits per second
+INDEX_FINGERPRINT_SQL = "SELECT value FROM db_metadata WHERE key = 'index_version'"
+# Neuer Prozess (z.B. nach Template-Änderungen) = neue ETags
+_INDEX_ETAG_SALT = secrets.token_hex(4)
+
 @router.get("/", response_class=HTMLResponse)
 async def index(
     request: Request, 
     q: str = None,
     folder: int = None,
-    db: aiosqlite.Connection = Depends(get_db_connection)
+    page: int = 1,
+    db: aiosqlite.Connection = Depends(get_db_connection),
+    user_ctx: dict = Depends(current_user_context)
 ):
     """ Home page: List all recipes """
-    user_ctx = await get_user_context(request, db)
 
-    # Normalize search term
+    # Normalize search term and page
     q = q.strip() if q else None
+    page = max(page, 1)
+    offset = (page - 1) * PAGE_SIZE
+
+    # Conditional GET: unchanged data for the same user and query -> 304 without query + render
+    async with db.execute(INDEX_FINGERPRINT_SQL) as cursor:
+        fingerprint = tuple(await cursor.fetchone())
+    etag_source = repr((_INDEX_ETAG_SALT, fingerprint, q, folder, page, sorted(user_ctx.items())))
+    etag = '"' + hashlib.blake2b(etag_source.encode(), digest_size=8).hexdigest() + '"'
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=etag_headers(etag))
     
     search_error = None
     recipes = []
@@ -188,22 +313,23 @@ async def index(
         q_transformed, search_error = transform_search_query(q)
         
         try:
-            # Full-text search via FTS5 with lightweight column weighting (bm25)
-            fts_query = """
-                SELECT r.*, bm25(recipe_fts, 5.0, 3.0, 2.5, 2.0, 1.5, 1.0) AS score
+            # Full-text search via FTS5 with lightweight column weighting (bm25):
+            # the weights go into the rank column, ORDER BY rank uses FTS5's ranking path
+            fts_query = f"""
+                SELECT r.id, r.name, r.author, r.owner_id
                 FROM recipe_fts
                 JOIN recipes r ON r.id = recipe_fts.rowid
-                WHERE recipe_fts MATCH ?
+                WHERE recipe_fts MATCH ? AND recipe_fts.rank MATCH '{FTS_RANK}'
             """
             params = [q_transformed]
 
             if folder:
-                allowed_ids = await get_all_child_folder_ids(db, folder)
-                placeholders = ', '.join(['?'] * len(allowed_ids))
-                fts_query += f" AND r.folder_id IN ({placeholders})"
-                params.extend(allowed_ids)
+                # Unterordner direkt als Subquery: ein fester Statement-Text, keine Extra-Abfrage
+                fts_query += f" AND r.folder_id IN ({FOLDER_SUBTREE_SQL})"
+                params.append(folder)
 
-            fts_query += " ORDER BY score, r.updated_at DESC"
+            fts_query += " ORDER BY recipe_fts.rank, r.updated_at DESC LIMIT ? OFFSET ?"
+            params += [PAGE_SIZE + 1, offset]
 
             async with db.execute(fts_query, params) as cursor:
                 recipes = await cursor.fetchall()
@@ -213,24 +339,26 @@ async def index(
             recipes = []
     else:
         # No search term: fallback to latest recipes (optionally filtered by folder)
-        list_query = "SELECT * FROM recipes WHERE 1=1"
+        list_query = f"SELECT {INDEX_COLUMNS} FROM recipes WHERE 1=1"
         params = []
 
         if folder:
-            allowed_ids = await get_all_child_folder_ids(db, folder)
-            placeholders = ', '.join(['?'] * len(allowed_ids))
-            list_query += f" AND folder_id IN ({placeholders})"
-            params.extend(allowed_ids)
+            list_query += f" AND folder_id IN ({FOLDER_SUBTREE_SQL})"
+            params.append(folder)
 
-        list_query += " ORDER BY created_at DESC"
+        list_query += " ORDER BY created_at DESC LIMIT ? OFFSET ?"
+        params += [PAGE_SIZE + 1, offset]
 
         async with db.execute(list_query, params) as cursor:
             recipes = await cursor.fetchall()
         
+    has_next = len(recipes) > PAGE_SIZE
+    recipes = recipes[:PAGE_SIZE]
+
     breadcrumbs = await get_breadcrumbs(db, folder) if folder else []
     folder_tree = await get_folder_tree(db)
 
-    return templates.TemplateResponse("index.html", {
+    response = templates.TemplateResponse("index.html", {
         "request": request,
         "recipes": recipes,
         "folder_tree": folder_tree,
@@ -240,22 +368,52 @@ async def index(
         "breadcrumbs": breadcrumbs,
         "search_error": search_error,
         "search_query": q,
+        "page": page,
+        "has_next": has_next,
         **user_ctx
     })
+    response.headers.update(etag_headers(etag))
+    return response
 
 @router.get("/recipe/{recipe_id}", response_class=HTMLResponse)
-async def read_recipe(request: Request, recipe_id: int, db: aiosqlite.Connection = Depends(get_db_connection)):
+async def read_recipe(
+    request: Request,
+    recipe_id: int,
+    db: aiosqlite.Connection = Depends(get_db_connection),
+    user_ctx: dict = Depends(current_user_context)
+):
     """ Detail view with permissions check """
-    user_ctx = await get_user_context(request, db)
-    
-    # Fetch recipe
-    async with db.execute("SELECT * FROM recipes WHERE id = ?", (recipe_id,)) as cursor:
-        row = await cursor.fetchone()
-        
-    if not row:
+    from md import md_to_html_many, format_ingredient_html
+
+    # Fetch steps with category metadata (only what view_recipe.html shows)
+    query_steps = """
+        SELECT s.id, s.markdown_text, c.html_color, c.codepoint
+        FROM steps s
+        LEFT JOIN step_categories c ON s.category_id = c.id
+        WHERE s.recipe_id = ? 
+        ORDER BY s.position
+    """
+    # All ingredients of the recipe in one query, bucketed per step below
+    query_ing = """
+        SELECT i.step_id, i.amount_min, i.amount_max, i.item, i.note, u.symbol as unit_symbol 
+        FROM ingredients i 
+        JOIN steps s ON i.step_id = s.id
+        LEFT JOIN units u ON i.unit_id = u.id 
+        WHERE s.recipe_id = ? 
+        ORDER BY i.position
+    """
+    # Independent reads are queued together instead of awaiting each in turn
+    # (no units query: the HTML rendering doesn't use the unit map)
+    recipe_rows, steps, ingredients = await asyncio.gather(
+        db.execute_fetchall("SELECT * FROM recipes WHERE id = ?", (recipe_id,)),
+        db.execute_fetchall(query_steps, (recipe_id,)),
+        db.execute_fetchall(query_ing, (recipe_id,)),
+    )
+
+    if not recipe_rows:
         raise HTTPException(status_code=404, detail="Recipe not found")
 
-    recipe = dict(row)
+    recipe = recipe_rows[0]
 
     # Check permissions
     can_edit = False
@@ -267,56 +425,31 @@ async def read_recipe(request: Request, recipe_id: int, db: aiosqlite.Connection
     elif user_ctx["user_id"] and user_ctx["user_id"] == recipe["owner_id"]:
         can_edit = True
 
-    # Fetch steps with category metadata
-    query_steps = """
-        SELECT s.*, c.html_color, c.label_de, c.codepoint
-        FROM steps s
-        LEFT JOIN step_categories c ON s.category_id = c.id
-        WHERE s.recipe_id = ? 
-        ORDER BY s.position
-    """
-    async with db.execute(query_steps, (recipe_id,)) as cursor:
-        steps = await cursor.fetchall()
-        
-    # Fetch ingredients and render markdown
-    from md import md_to_html, format_ingredient_quantity, load_unit_map
-    
-    # Load units from DB
-    async with db.execute("SELECT symbol, latex_code FROM units ORDER BY name") as cursor:
-        db_units = await cursor.fetchall()
-    unit_map = load_unit_map(db_units)
-
-    steps_data = []
-    for step in steps:
-        s_dict = dict(step)
-        # s_dict["html_text"] = markdown.markdown(s_dict.get("markdown_text") or "", extensions=["extra"]) 
-        s_dict["html_text"] = md_to_html(s_dict.get("markdown_text") or "", unit_map)
-        query = """
-            SELECT i.*, u.symbol as unit_symbol 
-            FROM ingredients i 
-            LEFT JOIN units u ON i.unit_id = u.id 
-            WHERE step_id = ? 
-            ORDER BY i.position
-        """
-        async with db.execute(query, (step["id"],)) as i_cursor:
-            ingredients = await i_cursor.fetchall()
-            # Format quantities for display
-            formatted_ingredients = []
-            for ing in ingredients:
-                ing_dict = dict(ing)
-                ing_dict["formatted_qty"] = format_ingredient_quantity(
-                    ing["amount_min"],
-                    ing["amount_max"],
-                    ing["unit_symbol"],
-                    format='html',
-                    unit_map=unit_map
-                )
-                formatted_ingredients.append(ing_dict)
-            s_dict["ingredients"] = formatted_ingredients
-        steps_data.append(s_dict)
+    ingredients_by_step = defaultdict(list)
+    for ing in ingredients:
+        # Rows go straight into the template dicts, no dict(row) copy per row
+        ingredients_by_step[ing["step_id"]].append({
+            "item": ing["item"],
+            "note": ing["note"],
+            # Format quantities for display (memoized: same amounts + unit = same HTML)
+            "formatted_qty": format_ingredient_html(ing["amount_min"], ing["amount_max"], ing["unit_symbol"]),
+        })
 
-    # Render markdown in preamble
-    preamble_html = md_to_html(recipe.get("preamble") or "", unit_map)
+    # Markdown is CPU-bound pure Python: render all steps and the preamble
+    # in one worker-thread call instead of blocking the event loop
+    texts = [step["markdown_text"] or "" for step in steps]
+    texts.append(recipe["preamble"] or "")
+    *html_texts, preamble_html = await asyncio.to_thread(md_to_html_many, texts)
+
+    steps_data = [
+        {
+            "html_color": step["html_color"],
+            "codepoint": step["codepoint"],
+            "html_text": html_text,
+            "ingredients": ingredients_by_step[step["id"]],
+        }
+        for step, html_text in zip(steps, html_texts)
+    ]
 
     # Get breadcrumbs
     breadcrumbs = await get_breadcrumbs(db, recipe["folder_id"])
@@ -333,57 +466,56 @@ async def read_recipe(request: Request, recipe_id: int, db: aiosqlite.Connection
     })
 
 @router.get("/recipe/{recipe_id}/edit", response_class=HTMLResponse)
-async def edit_recipe(request: Request, recipe_id: int, db: aiosqlite.Connection = Depends(get_db_connection)):
+async def edit_recipe(
+    request: Request,
+    recipe_id: int,
+    db: aiosqlite.Connection = Depends(get_db_connection),
+    user_ctx: dict = Depends(current_user_context)
+):
     """ Edit recipe page """
-    user_ctx = await get_user_context(request, db)
-    
-    async with db.execute("SELECT * FROM recipes WHERE id = ?", (recipe_id,)) as cursor:
-        recipe = await cursor.fetchone()
-    
-    if not recipe:
+    # Independent reads are queued together instead of awaiting each in turn
+    recipe_rows, steps_raw, ingredients, (categories, units), folder_tree = await asyncio.gather(
+        db.execute_fetchall("SELECT * FROM recipes WHERE id = ?", (recipe_id,)),
+        # Steps with category metadata
+        db.execute_fetchall("""
+            SELECT s.*, c.label_de, c.id as category_id, c.is_ingredients
+            FROM steps s
+            LEFT JOIN step_categories c ON s.category_id = c.id
+            WHERE s.recipe_id = ?
+            ORDER BY s.position
+        """, (recipe_id,)),
+        # All ingredients of the recipe, bucketed per step below
+        db.execute_fetchall("""
+            SELECT i.*, u.symbol, u.latex_code
+            FROM ingredients i
+            JOIN steps s ON i.step_id = s.id
+            LEFT JOIN units u ON i.unit_id = u.id
+            WHERE s.recipe_id = ?
+            ORDER BY i.position
+        """, (recipe_id,)),
+        # Selectable categories (non-ingredient, id > 1) and all units
+        get_editor_choices(db),
+        # Folders for dropdown
+        get_folder_tree(db),
+    )
+
+    if not recipe_rows:
         raise HTTPException(status_code=404, detail="Recipe not found")
+    recipe = recipe_rows[0]
     
     # Only admin or owner can edit
     if not user_ctx["is_admin"] and user_ctx["user_id"] != recipe["owner_id"]:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    # Fetch steps with ingredients
-    async with db.execute("""
-        SELECT s.*, c.label_de, c.id as category_id, c.is_ingredients
-        FROM steps s
-        LEFT JOIN step_categories c ON s.category_id = c.id
-        WHERE s.recipe_id = ?
-        ORDER BY s.position
-    """, (recipe_id,)) as cursor:
-        steps_raw = await cursor.fetchall()
-    
+    ingredients_by_step = defaultdict(list)
+    for ing in ingredients:
+        ingredients_by_step[ing["step_id"]].append(ing)
+
     steps_data = []
     for step in steps_raw:
         s_dict = dict(step)
-        async with db.execute("""
-            SELECT i.*, u.symbol, u.latex_code
-            FROM ingredients i
-            LEFT JOIN units u ON i.unit_id = u.id
-            WHERE step_id = ?
-            ORDER BY i.position
-        """, (step["id"],)) as i_cursor:
-            s_dict["ingredients"] = await i_cursor.fetchall()
+        s_dict["ingredients"] = ingredients_by_step[step["id"]]
         steps_data.append(s_dict)
-    
-    # Get selectable categories (non-ingredient, id > 1)
-    async with db.execute("""
-        SELECT * FROM step_categories 
-        WHERE is_ingredients = 0 AND id > 1
-        ORDER BY label_de
-    """) as cursor:
-        categories = await cursor.fetchall()
-    
-    # Get all units for ingredient editor
-    async with db.execute("SELECT * FROM units ORDER BY name") as cursor:
-        units = await cursor.fetchall()
-    
-    # Get folders for dropdown
-    folder_tree = await get_folder_tree(db)
 
     return templates.TemplateResponse("edit_recipe.html", {
         "request": request,
@@ -396,203 +528,217 @@ async def edit_recipe(request: Request, recipe_id: int, db: aiosqlite.Connection
     })
 
 @router.post("/recipe/{recipe_id}/edit")
-async def update_recipe(request: Request, recipe_id: int, db: aiosqlite.Connection = Depends(get_db_connection)):
-    user_ctx = await get_user_context(request, db)
-    
-    # Check permissions
-    async with db.execute("SELECT owner_id, folder_id, name, author, source, preamble FROM recipes WHERE id = ?", (recipe_id,)) as cursor:
-        row = await cursor.fetchone()
-        
-    if not row:
-        raise HTTPException(status_code=404, detail="Recipe not found")
+async def update_recipe(
+    request: Request,
+    recipe_id: int,
+    db: aiosqlite.Connection = Depends(get_db_connection),
+    user_ctx: dict = Depends(current_user_context)
+):
     
-    if not user_ctx["is_admin"] and user_ctx["user_id"] != row["owner_id"]:
+    # Without login there is nothing to update: 403 before parsing the (multipart) body.
+    # The authoritative check is the UPDATE ... RETURNING below
+    if user_ctx["user_id"] is None and not user_ctx["is_admin"]:
         raise HTTPException(status_code=403, detail="Not authorized")
 
     # Parse form data
     form = await request.form()
     
-    # Get new values
-    new_folder_id = form.get("folder_id")
-    new_name = form.get("name")
-    new_author = form.get("author")
-    new_source = form.get("source")
-    new_preamble = form.get("preamble")
-    
-    # Check if base recipe data changed
-    base_data_changed = (
-        str(row["folder_id"] or "") != str(new_folder_id or "") or
-        row["name"] != new_name or
-        row["author"] != new_author or
-        row["source"] != new_source or
-        row["preamble"] != new_preamble
-    )
-    
-    # Update base recipe data - only set updated_at if something changed
-    if base_data_changed:
-        await db.execute("""
-            UPDATE recipes 
-            SET folder_id=?, name=?, author=?, source=?, preamble=?, updated_at=CURRENT_TIMESTAMP 
-            WHERE id=?
-        """, (new_folder_id, new_name, new_author, new_source, new_preamble, recipe_id))
-    else:
-        await db.execute("""
+    async with write_transaction(db):
+        # Permission check and base data update in one statement: the WHERE only
+        # matches for admins/owners, updated_at is only bumped if something changed
+        # (SET expressions see the old values, IFNULL/CAST mirror str(x or ""))
+        async with db.execute("""
             UPDATE recipes 
-            SET folder_id=?, name=?, author=?, source=?, preamble=?
-            WHERE id=?
-        """, (new_folder_id, new_name, new_author, new_source, new_preamble, recipe_id))
-
-    # Process steps and ingredients
-    kept_step_ids = []
-    steps_changed = False
-    
-    step_idx = 0
-    while f"steps[{step_idx}][position]" in form:
-        s_prefix = f"steps[{step_idx}]"
-        
-        step_id_str = form.get(f"{s_prefix}[id]")
-        step_id = int(step_id_str) if step_id_str else None
-        
-        position = form.get(f"{s_prefix}[position]")
-        markdown_text = form.get(f"{s_prefix}[markdown_text]")
-        
-        # Typ/Kategorie Logik
-        step_type = form.get(f"{s_prefix}[type]")
-        if step_type == 'category':
-            raw_cat = form.get(f"{s_prefix}[category_id]")
-            cat_id = int(raw_cat) if raw_cat and raw_cat.isdigit() else 1
-        else:
-            cat_id = 1
-
-        # Upsert step
-        if step_id:
-            # Fetch old values to check if anything changed
-            async with db.execute("SELECT position, markdown_text, category_id FROM steps WHERE id=?", (step_id,)) as cursor:
-                old_step = await cursor.fetchone()
-            
-            step_changed = (
-                old_step and (
-                    str(old_step["position"]) != str(position) or
-                    old_step["markdown_text"] != markdown_text or
-                    old_step["category_id"] != cat_id
-                )
-            )
-            
-            if step_changed:
-                await db.execute("""
-                    UPDATE steps SET position=?, markdown_text=?, category_id=? WHERE id=?
-                """, (position, markdown_text, cat_id, step_id))
-                steps_changed = True
-                
-            kept_step_ids.append(step_id)
-            current_step_db_id = step_id
-        else:
-            # RETURNING id is supported by newer SQLite versions,
-            # alternatively use cursor.lastrowid (see below for ingredients)
-            cursor = await db.execute("""
-                INSERT INTO steps (recipe_id, position, markdown_text, category_id) 
-                VALUES (?, ?, ?, ?) RETURNING id
-            """, (recipe_id, position, markdown_text, cat_id))
-            new_step_row = await cursor.fetchone()
-            current_step_db_id = new_step_row[0]
-            kept_step_ids.append(current_step_db_id)
-            steps_changed = True
-
-        # Process ingredients
+            SET folder_id=:folder_id, name=:name, author=:author, source=:source, preamble=:preamble,
+                updated_at = CASE WHEN
+                    IFNULL(CAST(folder_id AS TEXT), '') IS NOT IFNULL(:folder_id, '') OR
+                    name IS NOT :name OR author IS NOT :author OR
+                    source IS NOT :source OR preamble IS NOT :preamble
+                THEN CURRENT_TIMESTAMP ELSE updated_at END
+            WHERE id=:id AND (:is_admin OR owner_id IS :user_id)
+            RETURNING id
+        """, {
+            "folder_id": form.get("folder_id"),
+            "name": form.get("name"),
+            "author": form.get("author"),
+            "source": form.get("source"),
+            "preamble": form.get("preamble"),
+            "id": recipe_id,
+            "is_admin": 1 if user_ctx["is_admin"] else 0,
+            "user_id": user_ctx["user_id"],
+        }) as cursor:
+            updated = await cursor.fetchone()
+
+        if not updated:
+            # Nur im Fehlerfall nachschauen, ob es das Rezept überhaupt gibt
+            async with db.execute("SELECT 1 FROM recipes WHERE id = ?", (recipe_id,)) as cursor:
+                exists = await cursor.fetchone()
+            if not exists:
+                raise HTTPException(status_code=404, detail="Recipe not found")
+            raise HTTPException(status_code=403, detail="Not authorized")
+
+        # Process steps and ingredients: collect rows first, write them in batches below
+        kept_step_ids = []
+        steps_changed = False
+        step_updates = []
+        ing_updates = []
+        ing_inserts = []
         kept_ing_ids = []
-        ing_idx = 0
-        while f"{s_prefix}[ingredients][{ing_idx}][item]" in form:
-            i_prefix = f"{s_prefix}[ingredients][{ing_idx}]"
-            
-            ing_id_str = form.get(f"{i_prefix}[id]")
-            ing_id = int(ing_id_str) if ing_id_str else None
-            
-            # Parsing
-            amt_combined = form.get(f"{i_prefix}[amount_combined]")
-            amount_min, amount_max = parse_amount(amt_combined)
-            
-            unit_id = form.get(f"{i_prefix}[unit_id]") or None
-            item = form.get(f"{i_prefix}[item]")
-            note = form.get(f"{i_prefix}[note]")
-            
-            if ing_id:
-                # Fetch old values to check if anything changed
-                async with db.execute("SELECT position, amount_min, amount_max, unit_id, item, note FROM ingredients WHERE id=?", (ing_id,)) as cursor:
-                    old_ing = await cursor.fetchone()
-                
-                ing_changed = (
-                    old_ing and (
-                        old_ing["position"] != ing_idx + 1 or
-                        old_ing["amount_min"] != amount_min or
-                        old_ing["amount_max"] != amount_max or
-                        str(old_ing["unit_id"] or "") != str(unit_id or "") or
-                        old_ing["item"] != item or
-                        old_ing["note"] != note
+        # Neue Schritte werden nach der Schleife gemeinsam eingefügt; ihre Zutaten
+        # merken wir uns bis dahin mit dem Index in new_steps statt der (noch fehlenden) ID
+        new_steps = []
+        new_step_ings = []
+
+        # Current rows of this recipe, loaded once for the "changed?" diff below
+        old_steps = {r["id"]: r for r in await db.execute_fetchall(
+            "SELECT id, position, markdown_text, category_id FROM steps WHERE recipe_id=?", (recipe_id,)
+        )}
+        old_ings = {r["id"]: r for r in await db.execute_fetchall("""
+            SELECT i.id, i.position, i.amount_min, i.amount_max, i.unit_id, i.item, i.note
+            FROM ingredients i JOIN steps s ON i.step_id = s.id
+            WHERE s.recipe_id=?
+        """, (recipe_id,))}
+
+        for fields, ings in parse_steps_form(form):
+            step_id_str = fields.get("id")
+            step_id = int(step_id_str) if step_id_str else None
+
+            position = fields.get("position")
+            markdown_text = fields.get("markdown_text")
+
+            # Typ/Kategorie Logik
+            step_type = fields.get("type")
+            if step_type == 'category':
+                raw_cat = fields.get("category_id")
+                cat_id = int(raw_cat) if raw_cat and raw_cat.isdigit() else 1
+            else:
+                cat_id = 1
+
+            # Upsert step
+            if step_id:
+                # Compare with the old values to check if anything changed
+                old_step = old_steps.get(step_id)
+
+                step_changed = (
+                    old_step and (
+                        str(old_step["position"]) != str(position) or
+                        old_step["markdown_text"] != markdown_text or
+                        old_step["category_id"] != cat_id
                     )
                 )
-                
-                if ing_changed:
-                    await db.execute("""
-                        UPDATE ingredients 
-                        SET position=?, amount_min=?, amount_max=?, unit_id=?, item=?, note=?
-                        WHERE id=?
-                    """, (ing_idx + 1, amount_min, amount_max, unit_id, item, note, ing_id))
+
+                if step_changed:
+                    step_updates.append((position, markdown_text, cat_id, step_id))
                     steps_changed = True
-                    
-                kept_ing_ids.append(ing_id)
+
+                kept_step_ids.append(step_id)
+                current_step_db_id = step_id
             else:
-                # Insert NEUE Zutat - WICHTIG: Cursor nutzen um ID zu holen!
-                cursor = await db.execute("""
-                    INSERT INTO ingredients (step_id, position, amount_min, amount_max, unit_id, item, note)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                """, (current_step_db_id, ing_idx + 1, amount_min, amount_max, unit_id, item, note))
-                
-                # FIX: Die ID der neuen Zutat auf die "Behalten-Liste" setzen!
-                new_ing_id = cursor.lastrowid 
-                kept_ing_ids.append(new_ing_id)
+                current_step_db_id = None
+                new_steps.append((recipe_id, position, markdown_text, cat_id))
                 steps_changed = True
-            
-            ing_idx += 1
-            
-        # Cleanup: Delete all ingredients of this step that were NOT edited/created
-        if kept_ing_ids:
-            placeholders = ",".join("?" * len(kept_ing_ids))
-            result = await db.execute(f"DELETE FROM ingredients WHERE step_id=? AND id NOT IN ({placeholders})", (current_step_db_id, *kept_ing_ids))
-            if result.rowcount > 0:
-                steps_changed = True
-        else:
-            # If no ingredients remain -> Delete all
-            result = await db.execute("DELETE FROM ingredients WHERE step_id=?", (current_step_db_id,))
-            if result.rowcount > 0:
-                steps_changed = True
-            
-        step_idx += 1
 
-    # Cleanup: Delete steps
-    if kept_step_ids:
-        placeholders = ",".join("?" * len(kept_step_ids))
-        result = await db.execute(f"DELETE FROM steps WHERE recipe_id=? AND id NOT IN ({placeholders})", (recipe_id, *kept_step_ids))
+            # Process ingredients
+            for ing_idx, ing in enumerate(ings):
+                ing_id_str = ing.get("id")
+                ing_id = int(ing_id_str) if ing_id_str else None
+
+                # Parsing
+                amt_combined = ing.get("amount_combined")
+                amount_min, amount_max = parse_amount(amt_combined)
+
+                unit_id = ing.get("unit_id") or None
+                item = ing.get("item")
+                note = ing.get("note")
+
+                if ing_id:
+                    # Compare with the old values to check if anything changed
+                    old_ing = old_ings.get(ing_id)
+
+                    ing_changed = (
+                        old_ing and (
+                            old_ing["position"] != ing_idx + 1 or
+                            old_ing["amount_min"] != amount_min or
+                            old_ing["amount_max"] != amount_max or
+                            str(old_ing["unit_id"] or "") != str(unit_id or "") or
+                            old_ing["item"] != item or
+                            old_ing["note"] != note
+                        )
+                    )
+
+                    if ing_changed:
+                        ing_updates.append((ing_idx + 1, amount_min, amount_max, unit_id, item, note, ing_id))
+                        steps_changed = True
+
+                    kept_ing_ids.append(ing_id)
+                else:
+                    # Neue Zutaten werden erst nach dem Cleanup eingefügt,
+                    # dadurch brauchen wir ihre IDs nicht für die Behalten-Liste
+                    ing_row = (ing_idx + 1, amount_min, amount_max, unit_id, item, note)
+                    if current_step_db_id is None:
+                        new_step_ings.append((len(new_steps) - 1, ing_row))
+                    else:
+                        ing_inserts.append((current_step_db_id, *ing_row))
+                    steps_changed = True
+
+        # All new steps in one multi-row INSERT, then hand their ids to the pending ingredients
+        new_step_ids = await insert_values(db, "INSERT INTO steps (recipe_id, position, markdown_text, category_id)", new_steps, returning_id=True)
+        kept_step_ids.extend(new_step_ids)
+        ing_inserts.extend((new_step_ids[idx], *ing_row) for idx, ing_row in new_step_ings)
+
+        if step_updates:
+            await db.executemany("""
+                UPDATE steps SET position=?, markdown_text=?, category_id=? WHERE id=?
+            """, step_updates)
+        if ing_updates:
+            await db.executemany("""
+                UPDATE ingredients 
+                SET position=?, amount_min=?, amount_max=?, unit_id=?, item=?, note=?
+                WHERE id=?
+            """, ing_updates)
+
+        # Cleanup: the kept ids go in as one JSON array parameter (json_each), so the
+        # SQL text is fixed (statement cache hits) and big recipes hit no parameter limit
+        # Delete all ingredients of the recipe that were NOT edited (one statement for all steps)
+        result = await db.execute("""
+            DELETE FROM ingredients
+            WHERE step_id IN (SELECT id FROM steps WHERE recipe_id=?)
+              AND id NOT IN (SELECT value FROM json_each(?))
+        """, (recipe_id, json.dumps(kept_ing_ids)))
         if result.rowcount > 0:
             steps_changed = True
-    else:
-        result = await db.execute("DELETE FROM steps WHERE recipe_id=?", (recipe_id,))
+
+        if ing_inserts:
+            await db.executemany("""
+                INSERT INTO ingredients (step_id, position, amount_min, amount_max, unit_id, item, note)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, ing_inserts)
+
+        # Cleanup: Delete steps
+        result = await db.execute(
+            "DELETE FROM steps WHERE recipe_id=? AND id NOT IN (SELECT value FROM json_each(?))",
+            (recipe_id, json.dumps(kept_step_ids))
+        )
         if result.rowcount > 0:
             steps_changed = True
-    
-    # Only update recipe timestamp if there were actual changes to base data or steps
-    if steps_changed and not base_data_changed:
-        await db.execute("""
-            UPDATE recipes SET updated_at=CURRENT_TIMESTAMP WHERE id=?
-        """, (recipe_id,))
 
-    await db.commit()
-    
+        # Only update recipe timestamp if there were actual changes to the steps
+        # (if the base data changed too, this just refreshes the same timestamp)
+        if steps_changed:
+            await db.execute("""
+                UPDATE recipes SET updated_at=CURRENT_TIMESTAMP WHERE id=?
+            """, (recipe_id,))
+
     redirect_url = request.url_for("read_recipe", recipe_id=recipe_id)
     return RedirectResponse(url=redirect_url, status_code=303)
     
 @router.get("/recipe/{recipe_id}/delete")
-async def delete_recipe(request: Request, recipe_id: int, db: aiosqlite.Connection = Depends(get_db_connection)):
-    user_ctx = await get_user_context(request, db)
+async def delete_recipe(
+    request: Request,
+    recipe_id: int,
+    db: aiosqlite.Connection = Depends(get_db_connection),
+    user_ctx: dict = Depends(current_user_context)
+):
     
     # Check rights
     async with db.execute("SELECT owner_id FROM recipes WHERE id = ?", (recipe_id,)) as cursor:
@@ -606,16 +752,19 @@ async def delete_recipe(request: Request, recipe_id: int, db: aiosqlite.Connecti
         raise HTTPException(status_code=403, detail="Only admins can delete")
 
     # Delete (thanks to ON DELETE CASCADE in DB, steps/ingredients are deleted automatically)
-    await db.execute("DELETE FROM recipes WHERE id = ?", (recipe_id,))
-    await db.commit()
+    async with write_transaction(db):
+        await db.execute("DELETE FROM recipes WHERE id = ?", (recipe_id,))
     
     # Back to list
     redirect_url = request.url_for("index")
     return RedirectResponse(url=redirect_url, status_code=303)
 
 @router.get("/add", response_class=HTMLResponse)
-async def add_recipe_form(request: Request, db: aiosqlite.Connection = Depends(get_db_connection)):
-    user_ctx = await get_user_context(request, db)
+async def add_recipe_form(
+    request: Request,
+    db: aiosqlite.Connection = Depends(get_db_connection),
+    user_ctx: dict = Depends(current_user_context)
+):
     
     if not user_ctx["user_id"]:
          return RedirectResponse(url="/auth/login", status_code=303)
@@ -629,13 +778,8 @@ async def add_recipe_form(request: Request, db: aiosqlite.Connection = Depends(g
         "preamble": ""
     }
     
-    # Categories
-    async with db.execute("SELECT * FROM step_categories WHERE is_ingredients = 0 AND id > 1 ORDER BY label_de") as cursor:
-        categories = await cursor.fetchall()
-    
-    # Units
-    async with db.execute("SELECT * FROM units ORDER BY name") as cursor:
-        units = await cursor.fetchall()
+    # Categories + units
+    categories, units = await get_editor_choices(db)
 
     folder_tree = await get_folder_tree(db)
 
@@ -651,88 +795,60 @@ async def add_recipe_form(request: Request, db: aiosqlite.Connection = Depends(g
     })
 
 @router.post("/add")
-async def create_recipe(request: Request, db: aiosqlite.Connection = Depends(get_db_connection)):
-    user_ctx = await get_user_context(request, db)
+async def create_recipe(
+    request: Request,
+    db: aiosqlite.Connection = Depends(get_db_connection),
+    user_ctx: dict = Depends(current_user_context)
+):
     if not user_ctx["user_id"]:
          raise HTTPException(status_code=403, detail="Nicht eingeloggt")
 
     form = await request.form()
-    print("--- DEBUG: CREATE RECIPE ---")
-    print(f"Form Keys: {list(form.keys())}") # Zeigt uns ALLE gesendeten Felder
-
-    # 1. Rezept INSERT
-    cursor = await db.execute("""
-        INSERT INTO recipes (folder_id, owner_id, name, author, source, preamble) 
-        VALUES (?, ?, ?, ?, ?, ?) RETURNING id
-    """, (
-        form.get("folder_id"),
-        user_ctx["user_id"],
-        form.get("name"), 
-        form.get("author"), 
-        form.get("source"), 
-        form.get("preamble")
-    ))
-    row = await cursor.fetchone()
-    new_recipe_id = row[0]
-    print(f"Rezept erstellt: ID {new_recipe_id}")
-
-    # 2. Schritte und Zutaten speichern
-    step_idx = 0
-    while f"steps[{step_idx}][position]" in form:
-        print(f"--> Verarbeite Schritt {step_idx}")
-        s_prefix = f"steps[{step_idx}]"
-        
-        position = form.get(f"{s_prefix}[position]")
-        markdown_text = form.get(f"{s_prefix}[markdown_text]")
-        
-        # Typ/Kategorie Logik
-        step_type = form.get(f"{s_prefix}[type]")
-        if step_type == 'category':
-            raw_cat = form.get(f"{s_prefix}[category_id]")
-            cat_id = int(raw_cat) if raw_cat and raw_cat.isdigit() else 1
-        else:
-            cat_id = 1
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Create recipe, form keys: %s", list(form.keys())) # Zeigt uns ALLE gesendeten Felder
 
-        # Step INSERT
+    async with write_transaction(db):
+        # 1. Rezept INSERT
         cursor = await db.execute("""
-            INSERT INTO steps (recipe_id, position, markdown_text, category_id) 
-            VALUES (?, ?, ?, ?) RETURNING id
-        """, (new_recipe_id, position, markdown_text, cat_id))
-        step_row = await cursor.fetchone()
-        current_step_db_id = step_row[0]
-        print(f"    Schritt DB-ID: {current_step_db_id}")
-
-        # Zutaten INSERT
-        ing_idx = 0
-        # Prüfe, ob der Key existiert
-        check_key = f"{s_prefix}[ingredients][{ing_idx}][item]"
-        if check_key in form:
-            print(f"    Zutat gefunden: {check_key}")
-        else:
-            print(f"    KEINE Zutat gefunden bei Key: {check_key}")
-
-        while f"{s_prefix}[ingredients][{ing_idx}][item]" in form:
-            i_prefix = f"{s_prefix}[ingredients][{ing_idx}]"
-            
-            # Parsing
-            amt_combined = form.get(f"{i_prefix}[amount_combined]")
-            amount_min, amount_max = parse_amount(amt_combined)
-            
-            unit_id = form.get(f"{i_prefix}[unit_id]") or None
-            item = form.get(f"{i_prefix}[item]")
-            note = form.get(f"{i_prefix}[note]")
-            
-            print(f"      -> Insert Zutat: {item} ({amount_min}-{amount_max})")
-            
-            await db.execute("""
-                INSERT INTO ingredients (step_id, position, amount_min, amount_max, unit_id, item, note)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (current_step_db_id, ing_idx + 1, amount_min, amount_max, unit_id, item, note))
-            
-            ing_idx += 1
-        step_idx += 1
+            INSERT INTO recipes (folder_id, owner_id, name, author, source, preamble) 
+            VALUES (?, ?, ?, ?, ?, ?) RETURNING id
+        """, (
+            form.get("folder_id"),
+            user_ctx["user_id"],
+            form.get("name"), 
+            form.get("author"), 
+            form.get("source"), 
+            form.get("preamble")
+        ))
+        row = await cursor.fetchone()
+        new_recipe_id = row[0]
+        logger.debug("Rezept erstellt: ID %s", new_recipe_id)
+
+        # 2. Schritte und Zutaten speichern: alle Schritte in einem INSERT, dann alle Zutaten
+        steps = parse_steps_form(form)
+        step_rows = []
+        for fields, ings in steps:
+            # Typ/Kategorie Logik
+            step_type = fields.get("type")
+            if step_type == 'category':
+                raw_cat = fields.get("category_id")
+                cat_id = int(raw_cat) if raw_cat and raw_cat.isdigit() else 1
+            else:
+                cat_id = 1
+            step_rows.append((new_recipe_id, fields.get("position"), fields.get("markdown_text"), cat_id))
+
+        step_ids = await insert_values(db, "INSERT INTO steps (recipe_id, position, markdown_text, category_id)", step_rows, returning_id=True)
+        logger.debug("%d Schritt(e) erstellt: %s", len(step_ids), step_ids)
+
+        ing_rows = []
+        for step_db_id, (fields, ings) in zip(step_ids, steps):
+            for ing_idx, ing in enumerate(ings):
+                # Parsing
+                amount_min, amount_max = parse_amount(ing.get("amount_combined"))
+                unit_id = ing.get("unit_id") or None
+                ing_rows.append((step_db_id, ing_idx + 1, amount_min, amount_max, unit_id, ing.get("item"), ing.get("note")))
+
+        await insert_values(db, "INSERT INTO ingredients (step_id, position, amount_min, amount_max, unit_id, item, note)", ing_rows)
+        logger.debug("%d Zutat(en) erstellt", len(ing_rows))
 
-    await db.commit()
-    print("--- DEBUG ENDE ---")
-    
     return RedirectResponse(url=request.url_for("read_recipe", recipe_id=new_recipe_id), status_code=303)    
\ No newline at end of file
@@ -1,11 +1,37 @@
 # template_config.py
 # Zentrale Template-Konfiguration für alle Router
+import os
+
+import jinja2
 from fastapi.templating import Jinja2Templates
 
+from database import get_config
 from i18n import get_translations, get_locale
 
+config = get_config()
+
+# Compiled templates survive restarts in the bytecode cache (also used by the LaTeX env in routers/pdf.py)
+JINJA_CACHE_DIR = os.path.join(os.path.abspath(config['pdf_cache_dir']), "jinja")
+os.makedirs(JINJA_CACHE_DIR, exist_ok=True)
+
+# Ein Environment für alle Router: ein gemeinsamer Template-Cache
+env = jinja2.Environment(
+    loader=jinja2.FileSystemLoader("templates"),
+    autoescape=jinja2.select_autoescape(["html", "xml"]),
+    extensions=["jinja2.ext.i18n"],
+    bytecode_cache=jinja2.FileSystemBytecodeCache(JINJA_CACHE_DIR),
+    cache_size=400,  # Jinja-Default, reicht für alle Templates
+    # Ohne debug keine Template-Änderungen zur Laufzeit: spart den mtime-Check pro Render
+    auto_reload=bool(config.get("debug", False)),
+)
+env.install_gettext_translations(get_translations())
+env.globals["current_lang"] = get_locale()
+
 # Wird von allen Routern importiert
-templates = Jinja2Templates(directory="templates")
-templates.env.add_extension("jinja2.ext.i18n")
-templates.env.install_gettext_translations(get_translations())
-templates.env.globals["current_lang"] = get_locale()
+templates = Jinja2Templates(env=env)
+
+
+def precompile_templates():
+    """Loads every template once at startup so the first request doesn't pay the compile."""
+    for name in env.list_templates(extensions=["html"]):
+        env.get_template(name)
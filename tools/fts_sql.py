@@ -0,0 +1,28 @@
+"""FTS flush statement shared by the app (database.py) and the tools.
+
+No dependencies besides sqlite3, so database.py can import it as tools.fts_sql
+and the scripts in tools/ as fts_sql.
+"""
+
+import sqlite3
+
+# Steps/ingredients triggers only queue the recipe in fts_dirty; this rebuilds
+# the aggregated FTS columns once per queued recipe instead of once per row
+FTS_FLUSH_SQL = """
+    UPDATE recipe_fts SET
+        ingredients = COALESCE((SELECT group_concat(item || ' ' || COALESCE(note,''), ' ') FROM (
+            SELECT i.item, i.note FROM ingredients i JOIN steps s ON i.step_id = s.id
+            WHERE s.recipe_id = recipe_fts.rowid ORDER BY s.position, i.position
+        )), ''),
+        steps = COALESCE((SELECT group_concat(markdown_text, ' ') FROM (
+            SELECT markdown_text FROM steps WHERE recipe_id = recipe_fts.rowid ORDER BY position
+        )), '')
+    WHERE rowid IN (SELECT recipe_id FROM fts_dirty)
+"""
+FTS_DIRTY_CLEAR_SQL = "DELETE FROM fts_dirty"
+
+
+def flush_fts(conn: sqlite3.Connection) -> None:
+    """Call before committing writes to steps/ingredients."""
+    conn.execute(FTS_FLUSH_SQL)
+    conn.execute(FTS_DIRTY_CLEAR_SQL)
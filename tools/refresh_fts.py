@@ -2,177 +2,171 @@
 
 Use when triggers were broken or FTS is out of sync. This script drops the
 FTS table and all related triggers, recreates them, and backfills all recipes
-with their ingredients and steps.
+with their ingredients and steps (which also empties the fts_dirty queue).
 
 Usage:
     python tools/refresh_fts.py
+
+Set FTS_DEBUG=1 to also check the query plans of the trigger statements.
 """
 
+import os
 import sqlite3
-from setup_db import get_db_path
+from fts_sql import FTS_FLUSH_SQL
+from setup_db import get_db_path, FTS_TRIGGERS
+
+# Drop and recreate the FTS table; the triggers come from setup_db.FTS_TRIGGERS so both
+# scripts install the same ones. Starts a transaction and leaves it open for the backfill.
+REBUILD_DDL = """
+BEGIN IMMEDIATE;
+
+-- Drop triggers and FTS table
+DROP TRIGGER IF EXISTS recipe_fts_ai;
+DROP TRIGGER IF EXISTS recipe_fts_au;
+DROP TRIGGER IF EXISTS recipe_fts_ad;
+DROP TRIGGER IF EXISTS recipe_fts_steps_ai;
+DROP TRIGGER IF EXISTS recipe_fts_steps_au;
+DROP TRIGGER IF EXISTS recipe_fts_steps_ad;
+DROP TRIGGER IF EXISTS recipe_fts_ing_ai;
+DROP TRIGGER IF EXISTS recipe_fts_ing_au;
+DROP TRIGGER IF EXISTS recipe_fts_ing_ad;
+
+DROP TABLE IF EXISTS recipe_fts;
+
+CREATE TABLE IF NOT EXISTS fts_dirty (recipe_id INTEGER PRIMARY KEY);
+DELETE FROM fts_dirty;
+
+-- Ordered (ingredients: covering) scans for the aggregation below
+CREATE INDEX IF NOT EXISTS idx_steps_recipe_pos ON steps(recipe_id, position);
+CREATE INDEX IF NOT EXISTS idx_ing_step_pos ON ingredients(step_id, position, item, note);
+
+-- Recreate non-contentless FTS5 table
+CREATE VIRTUAL TABLE recipe_fts USING fts5(
+    name,
+    author,
+    source,
+    preamble,
+    ingredients,
+    steps
+);
+""" + "".join(trigger_sql + ";" for trigger_sql in FTS_TRIGGERS)
+
+BACKFILL_BATCH_SIZE = 500
+
+# Last recipe id of the next batch after :last_id
+BATCH_END_SQL = "SELECT MAX(id) FROM (SELECT id FROM recipes WHERE id > ? ORDER BY id LIMIT ?)"
+
+# Backfill recipes lo < id <= hi: one grouped pass per child table instead of
+# two correlated subqueries per recipe
+BACKFILL_SQL = """
+    WITH ing_agg AS (
+      SELECT recipe_id, group_concat(item || ' ' || COALESCE(note,''), ' ') AS ingredients
+      FROM (
+        SELECT s.recipe_id, i.item, i.note FROM ingredients i JOIN steps s ON i.step_id = s.id
+        WHERE s.recipe_id > :lo AND s.recipe_id <= :hi
+        ORDER BY s.recipe_id, s.position, i.position
+      )
+      GROUP BY recipe_id
+    ),
+    step_agg AS (
+      SELECT recipe_id, group_concat(markdown_text, ' ') AS steps
+      FROM (
+        SELECT recipe_id, markdown_text FROM steps
+        WHERE recipe_id > :lo AND recipe_id <= :hi
+        ORDER BY recipe_id, position
+      )
+      GROUP BY recipe_id
+    )
+    INSERT INTO recipe_fts(rowid, name, author, source, preamble, ingredients, steps)
+    SELECT
+      r.id,
+      COALESCE(r.name, ''),
+      COALESCE(r.author, ''),
+      COALESCE(r.source, ''),
+      COALESCE(r.preamble, ''),
+      COALESCE(ia.ingredients, ''),
+      COALESCE(sa.steps, '')
+    FROM recipes r
+    LEFT JOIN ing_agg ia ON ia.recipe_id = r.id
+    LEFT JOIN step_agg sa ON sa.recipe_id = r.id
+    WHERE r.id > :lo AND r.id <= :hi
+"""
+
+
+# Representative statements of the trigger bodies (NEW/OLD replaced by literals) and the flush
+FTS_PLAN_CHECKS = (
+    "UPDATE recipe_fts SET name = '' WHERE rowid = 1",  # recipe_fts_au
+    "DELETE FROM recipe_fts WHERE rowid = 1",  # recipe_fts_ad
+    "SELECT recipe_id FROM steps WHERE id = 1",  # recipe_fts_ing_ai/_ad
+    "SELECT recipe_id FROM steps WHERE id IN (1, 2)",  # recipe_fts_ing_au
+    FTS_FLUSH_SQL,
+)
+
+
+def _is_full_scan(detail: str) -> bool:
+    if detail.startswith("SCAN ("):
+        return False  # Zwischenergebnis einer Subquery
+    if "VIRTUAL TABLE" in detail:
+        return detail.endswith("INDEX 0:")  # FTS5 ohne rowid/MATCH-Constraint
+    return detail.startswith("SCAN ") and "CONSTANT ROWS" not in detail
+
+
+def check_fts_plans(conn: sqlite3.Connection) -> None:
+    """Raises if a trigger/flush statement fell back to a full table scan."""
+    problems = []
+    for sql in FTS_PLAN_CHECKS:
+        for row in conn.execute("EXPLAIN QUERY PLAN " + sql):
+            if _is_full_scan(row[3]):
+                problems.append(f"{row[3]}  <-  {' '.join(sql.split())[:80]}")
+    if problems:
+        raise RuntimeError("FTS statements without index:\n" + "\n".join(problems))
 
 
 def rebuild_fts(conn: sqlite3.Connection) -> None:
     cur = conn.cursor()
 
-    # Drop triggers and FTS table
-    cur.executescript(
-        """
-        DROP TRIGGER IF EXISTS recipe_fts_ai;
-        DROP TRIGGER IF EXISTS recipe_fts_au;
-        DROP TRIGGER IF EXISTS recipe_fts_ad;
-        DROP TRIGGER IF EXISTS recipe_fts_steps_ai;
-        DROP TRIGGER IF EXISTS recipe_fts_steps_au;
-        DROP TRIGGER IF EXISTS recipe_fts_steps_ad;
-        DROP TRIGGER IF EXISTS recipe_fts_ing_ai;
-        DROP TRIGGER IF EXISTS recipe_fts_ing_au;
-        DROP TRIGGER IF EXISTS recipe_fts_ing_ad;
-
-        DROP TABLE IF EXISTS recipe_fts;
-        """
-    )
+    # Same page cache/mmap sizing as the app connections (database.CONNECTION_PRAGMAS),
+    # keeps the FTS doclists and group_concat temp data in memory during the backfill
+    cur.execute("PRAGMA cache_size = -64000")
+    cur.execute("PRAGMA temp_store = MEMORY")
+    cur.execute("PRAGMA mmap_size = 268435456")
 
-    # Recreate non-contentless FTS5 table
-    cur.executescript(
-        """
-        CREATE VIRTUAL TABLE recipe_fts USING fts5(
-            name,
-            author,
-            source,
-            preamble,
-            ingredients,
-            steps
-        );
-        """
-    )
+    # One transaction: drop, recreate and backfill commit together
+    # (the script leaves it open for the batched backfill below)
+    cur.executescript(REBUILD_DDL)
 
-    # Triggers: keep simple UPDATE/INSERT/DELETE behavior
-    cur.executescript(
-        """
-        -- Recipes INSERT
-        CREATE TRIGGER recipe_fts_ai AFTER INSERT ON recipes
-        BEGIN
-          INSERT INTO recipe_fts(rowid, name, author, source, preamble, ingredients, steps)
-          VALUES(
-            NEW.id,
-            COALESCE(NEW.name, ''),
-            COALESCE(NEW.author, ''),
-            COALESCE(NEW.source, ''),
-            COALESCE(NEW.preamble, ''),
-            '',
-            ''
-          );
-        END;
-
-        -- Recipes UPDATE
-        CREATE TRIGGER recipe_fts_au AFTER UPDATE ON recipes
-        BEGIN
-          UPDATE recipe_fts SET
-            name = COALESCE(NEW.name, ''),
-            author = COALESCE(NEW.author, ''),
-            source = COALESCE(NEW.source, ''),
-            preamble = COALESCE(NEW.preamble, '')
-          WHERE rowid = NEW.id;
-        END;
-
-        -- Recipes DELETE
-        CREATE TRIGGER recipe_fts_ad AFTER DELETE ON recipes
-        BEGIN
-          DELETE FROM recipe_fts WHERE rowid = OLD.id;
-        END;
-
-        -- Steps INSERT/UPDATE
-        CREATE TRIGGER recipe_fts_steps_ai AFTER INSERT ON steps
-        BEGIN
-          UPDATE recipe_fts SET steps = 
-            COALESCE((SELECT group_concat(markdown_text, ' ') FROM (
-              SELECT markdown_text FROM steps WHERE recipe_id = NEW.recipe_id ORDER BY position
-            )), '')
-          WHERE rowid = NEW.recipe_id;
-        END;
-
-        CREATE TRIGGER recipe_fts_steps_au AFTER UPDATE ON steps
-        BEGIN
-          UPDATE recipe_fts SET steps = 
-            COALESCE((SELECT group_concat(markdown_text, ' ') FROM (
-              SELECT markdown_text FROM steps WHERE recipe_id = NEW.recipe_id ORDER BY position
-            )), '')
-          WHERE rowid = NEW.recipe_id;
-        END;
-
-        -- Steps DELETE
-        CREATE TRIGGER recipe_fts_steps_ad AFTER DELETE ON steps
-        BEGIN
-          UPDATE recipe_fts SET steps = 
-            COALESCE((SELECT group_concat(markdown_text, ' ') FROM (
-              SELECT markdown_text FROM steps WHERE recipe_id = OLD.recipe_id ORDER BY position
-            )), '')
-          WHERE rowid = OLD.recipe_id;
-        END;
-
-        -- Ingredients INSERT/UPDATE/DELETE
-        CREATE TRIGGER recipe_fts_ing_ai AFTER INSERT ON ingredients
-        BEGIN
-          UPDATE recipe_fts SET ingredients = 
-            COALESCE((SELECT group_concat(item || ' ' || COALESCE(note,''), ' ') FROM (
-              SELECT i.item, i.note FROM ingredients i JOIN steps s ON i.step_id = s.id
-              WHERE s.recipe_id = (SELECT recipe_id FROM steps WHERE id = NEW.step_id)
-              ORDER BY s.position, i.position
-            )), '')
-          WHERE rowid = (SELECT recipe_id FROM steps WHERE id = NEW.step_id);
-        END;
-
-        CREATE TRIGGER recipe_fts_ing_au AFTER UPDATE ON ingredients
-        BEGIN
-          UPDATE recipe_fts SET ingredients = 
-            COALESCE((SELECT group_concat(item || ' ' || COALESCE(note,''), ' ') FROM (
-              SELECT i.item, i.note FROM ingredients i JOIN steps s ON i.step_id = s.id
-              WHERE s.recipe_id = (SELECT recipe_id FROM steps WHERE id = NEW.step_id)
-              ORDER BY s.position, i.position
-            )), '')
-          WHERE rowid = (SELECT recipe_id FROM steps WHERE id = NEW.step_id);
-        END;
-
-        CREATE TRIGGER recipe_fts_ing_ad AFTER DELETE ON ingredients
-        BEGIN
-          UPDATE recipe_fts SET ingredients = 
-            COALESCE((SELECT group_concat(item || ' ' || COALESCE(note,''), ' ') FROM (
-              SELECT i.item, i.note FROM ingredients i JOIN steps s ON i.step_id = s.id
-              WHERE s.recipe_id = (SELECT recipe_id FROM steps WHERE id = OLD.step_id)
-              ORDER BY s.position, i.position
-            )), '')
-          WHERE rowid = (SELECT recipe_id FROM steps WHERE id = OLD.step_id);
-        END;
-        """
-    )
+    # Backfill in keyset batches (bounded group_concat/temp data per statement),
+    # all inside the transaction above, so readers never see a half-filled index
+    try:
+        last_id = 0
+        while True:
+            cur.execute(BATCH_END_SQL, (last_id, BACKFILL_BATCH_SIZE))
+            batch_end = cur.fetchone()[0]
+            if batch_end is None:
+                break
+            cur.execute(BACKFILL_SQL, {"lo": last_id, "hi": batch_end})
+            last_id = batch_end
+        # One segment instead of one (or more) per batch
+        cur.execute("INSERT INTO recipe_fts(recipe_fts) VALUES('optimize')")
+    except Exception:
+        conn.rollback()
+        raise
+    conn.commit()
 
-    # Backfill all recipes
-    cur.executescript(
-        """
-        INSERT INTO recipe_fts(rowid, name, author, source, preamble, ingredients, steps)
-        SELECT
-          r.id,
-          COALESCE(r.name, ''),
-          COALESCE(r.author, ''),
-          COALESCE(r.source, ''),
-          COALESCE(r.preamble, ''),
-          COALESCE((SELECT group_concat(item || ' ' || COALESCE(note,''), ' ') FROM (
-            SELECT i.item, i.note FROM ingredients i JOIN steps s ON i.step_id = s.id
-            WHERE s.recipe_id = r.id ORDER BY s.position, i.position
-          )), ''),
-          COALESCE((SELECT group_concat(markdown_text, ' ') FROM (
-            SELECT markdown_text FROM steps WHERE recipe_id = r.id ORDER BY position
-          )), '')
-        FROM recipes r;
-        """
-    )
+    # Planner statistics for the indexes above
+    cur.execute("ANALYZE")
+    # Return the pages of the dropped FTS table to the OS (no-op unless auto_vacuum = INCREMENTAL);
+    # executescript() steps the pragma to completion, execute() would free a single page
+    conn.executescript("PRAGMA incremental_vacuum")
 
-    conn.commit()
+    if os.getenv("FTS_DEBUG"):
+        check_fts_plans(conn)
 
 
 def main() -> None:
     db_path = get_db_path()
-    conn = sqlite3.connect(db_path)
+    # Transaktion selbst steuern (BEGIN IMMEDIATE in REBUILD_DDL), wie in setup_db/seed_data
+    conn = sqlite3.connect(db_path, isolation_level=None)
     try:
         rebuild_fts(conn)
         print(f"FTS rebuilt successfully for: {db_path}")
@@ -1,35 +1,26 @@
 import sqlite3
-import yaml
-import os
-
-def get_db_path():
-    env = os.getenv("APP_ENV", "dev")
-    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    config_path = os.path.join(base_dir, "config.yaml")
-
-    with open(config_path, "r") as f:
-        full_config = yaml.safe_load(f)
-    config = {**full_config['common'], **full_config[env]}
-    db_url = config['database_url']
-    if "sqlite+aiosqlite:///" in db_url:
-        return db_url.replace("sqlite+aiosqlite:///", "")
-    return db_url.replace("sqlite:///", "")
+# get_db_path wie setup_db.py/refresh_fts.py: eine Config-Auswertung für alle Tools
+from fts_sql import flush_fts
+from setup_db import get_db_path
 
 def seed_test_data():
     db_path = get_db_path()
     print(f"--> Connecting to {db_path}...")
-    conn = sqlite3.connect(db_path)
+    # Transaktion selbst steuern: ein BEGIN IMMEDIATE, ein COMMIT am Ende
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA temp_store = MEMORY")
     cursor = conn.cursor()
 
     # --- 1. Hilfs-Daten holen (Units, Categories, User) ---
     
     # Units Mapping: {'g': 1, 'kg': 2, ...}
     cursor.execute("SELECT symbol, id FROM units")
-    u = {row[0]: row[1] for row in cursor.fetchall()}
+    u = dict(cursor.fetchall())
     
     # Categories Mapping: {'default': 1, 'warning': 2, ...}
     cursor.execute("SELECT name, id FROM step_categories")
-    c = {row[0]: row[1] for row in cursor.fetchall()}
+    c = dict(cursor.fetchall())
 
     # Owner ID holen (Wir nehmen den ersten Admin oder User)
     cursor.execute("SELECT id FROM users ORDER BY id ASC LIMIT 1")
@@ -51,6 +42,9 @@ def seed_test_data():
         "und alle Arten von Einheiten."
     )
     
+    # Ab hier Schreibsperre: Prüfung und Insert in einer Transaktion
+    cursor.execute("BEGIN IMMEDIATE")
+
     # Check if recipe already exists (um Dopplungen zu vermeiden, da wir nicht mehr löschen)
     cursor.execute("SELECT id FROM recipes WHERE name = ?", ('Ultimativer PDF-Testlauf: Alles auf einmal',))
     if cursor.fetchone():
@@ -76,11 +70,11 @@ def seed_test_data():
     s1 = cursor.lastrowid
     
     # KORREKTUR: Mehl und Note getrennt
-    cursor.execute("INSERT INTO ingredients (step_id, unit_id, position, amount_min, amount_max, item, note) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                   (s1, u.get('g'), 1, 400, 450, "Mehl", "Type 405"))
-    
-    cursor.execute("INSERT INTO ingredients (step_id, unit_id, position, amount_min, item, note) VALUES (?, ?, ?, ?, ?, ?)",
-                   (s1, u.get('TL'), 2, 2, "Backpulver", "gestrichen"))
+    # (step_id, unit_id, position, amount_min, amount_max, item, note), am Ende gesammelt eingefügt
+    ingredient_rows = [
+        (s1, u.get('g'), 1, 400, 450, "Mehl", "Type 405"),
+        (s1, u.get('TL'), 2, 2, None, "Backpulver", "gestrichen"),
+    ]
 
     # ------------------------------------------------
     # SCHRITT 2: Info (Icon)
@@ -100,12 +94,11 @@ def seed_test_data():
     """, (recipe_id, c.get('default', 1), 3, "Nun die flüssigen Zutaten verquirlen."))
     s3 = cursor.lastrowid
     
-    cursor.execute("INSERT INTO ingredients (step_id, unit_id, position, amount_min, item) VALUES (?, ?, ?, ?, ?)",
-                   (s3, u.get('ml'), 1, 250, "Milch"))
-    cursor.execute("INSERT INTO ingredients (step_id, unit_id, position, amount_min, item) VALUES (?, ?, ?, ?, ?)",
-                   (s3, u.get('Stk.'), 2, 3, "Eier"))
-    cursor.execute("INSERT INTO ingredients (step_id, unit_id, position, amount_min, item) VALUES (?, ?, ?, ?, ?)",
-                   (s3, u.get('Prise'), 3, 1, "Salz"))
+    ingredient_rows += [
+        (s3, u.get('ml'), 1, 250, None, "Milch", None),
+        (s3, u.get('Stk.'), 2, 3, None, "Eier", None),
+        (s3, u.get('Prise'), 3, 1, None, "Salz", None),
+    ]
 
     # ------------------------------------------------
     # SCHRITT 4: Warnung
@@ -131,8 +124,7 @@ def seed_test_data():
     """, (recipe_id, c.get('default', 1), 5, long_text))
     s5 = cursor.lastrowid
     
-    cursor.execute("INSERT INTO ingredients (step_id, unit_id, position, amount_min, item, note) VALUES (?, ?, ?, ?, ?, ?)",
-                   (s5, u.get('EL'), 1, 1, "Butter", "für die Form"))
+    ingredient_rows.append((s5, u.get('EL'), 1, 1, None, "Butter", "für die Form"))
 
     # ------------------------------------------------
     # SCHRITT 6: Variante
@@ -152,7 +144,14 @@ def seed_test_data():
     """, (recipe_id, c.get('tip', 1), 7, 
           "Schmeckt am besten frisch aus dem Ofen mit etwas Puderzucker bestreut."))
 
-    conn.commit()
+    cursor.executemany(
+        "INSERT INTO ingredients (step_id, unit_id, position, amount_min, amount_max, item, note) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        ingredient_rows
+    )
+
+    # Zutaten/Schritte im Suchindex nachziehen (Trigger merken das Rezept nur vor)
+    flush_fts(conn)
+    cursor.execute("COMMIT")
     conn.close()
     print("--> Test Data seeded successfully.")
 
@@ -1,353 +1,395 @@
 import sqlite3
 import yaml
+try:
+    from yaml import CSafeLoader as YamlLoader  # libyaml
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
 import os
-from passlib.context import CryptContext
+from itertools import chain
 
-# Setup password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt (cost 12, passlib default) of the default admin password "admin", computed once
+# with CryptContext(schemes=["bcrypt"]).hash("admin") instead of on every fresh setup
+ADMIN_PASSWORD_HASH = "$2b$12$DFo.nodljHWo.fjIXyH9U.pmDVZTrXA.FGd0DsAqeA742yv4pZ9Um"
+
+def insert_rows(cursor, insert_sql, rows):
+    """Inserts all rows with one multi-VALUES statement instead of one statement per row."""
+    group = "(" + ", ".join("?" * len(rows[0])) + ")"
+    cursor.execute(insert_sql + " VALUES " + ", ".join([group] * len(rows)),
+                   tuple(chain.from_iterable(rows)))
+
+# Resolved once at import; get_db_path() only stats the file
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONFIG_PATH = os.path.join(BASE_DIR, "config.yaml")
+
+# ((env, mtime_ns, size), db_path) of the last parse
+_db_path_cache = None
 
 def get_db_path():
     """
     Reads the config.yaml to determine the database path.
+    Cached until config.yaml (mtime/size) or APP_ENV changes.
     """
+    global _db_path_cache
     env = os.getenv("APP_ENV", "dev")
-    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    config_path = os.path.join(base_dir, "config.yaml")
 
-    with open(config_path, "r") as f:
-        full_config = yaml.safe_load(f)
+    st = os.stat(CONFIG_PATH)
+    key = (env, st.st_mtime_ns, st.st_size)
+    if _db_path_cache is not None and _db_path_cache[0] == key:
+        return _db_path_cache[1]
+
+    with open(CONFIG_PATH, "r") as f:
+        full_config = yaml.load(f, Loader=YamlLoader)
 
     config = {**full_config['common'], **full_config[env]}
     db_url = config['database_url']
-    if "sqlite+aiosqlite:///" in db_url:
-        path = db_url.replace("sqlite+aiosqlite:///", "")
-    else:
-        path = db_url.replace("sqlite:///", "")
+    path = db_url.removeprefix("sqlite+aiosqlite:///").removeprefix("sqlite:///")
+    _db_path_cache = (key, path)
     return path
 
+# Gesamtes Schema als ein Skript: executescript() parst und führt es in einem Rutsch aus.
+# Beginnt mit BEGIN IMMEDIATE und endet ohne COMMIT, damit Seeds und FTS-Backfill
+# in derselben Transaktion landen (init_db committet am Ende).
+SCHEMA_DDL = """
+BEGIN IMMEDIATE;
+
+-- Metadata table for schema versioning
+CREATE TABLE IF NOT EXISTS db_metadata (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+
+-- Users
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT UNIQUE NOT NULL,
+    password_hash TEXT NOT NULL,
+    display_name TEXT NOT NULL,
+    role TEXT DEFAULT 'guest',
+    is_active INTEGER DEFAULT 1,
+    email TEXT
+);
+
+-- Sessions (server-side session store)
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    expires_at TEXT NOT NULL,
+    last_seen TEXT NOT NULL,
+    user_agent TEXT,
+    ip_address TEXT,
+    FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_user_id ON sessions(user_id);
+
+-- Units
+CREATE TABLE IF NOT EXISTS units (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    latex_code TEXT NOT NULL,
+    type TEXT DEFAULT 'si'
+);
+
+-- Step Categories
+-- codepoint: Der Unicode-Codepunkt für das Icon (z.B. "E4E0")
+-- is_ingredients: Boolean Flag (1/0), ob hier Zutaten angezeigt werden sollen oder das Icon
+CREATE TABLE IF NOT EXISTS step_categories (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL UNIQUE,
+    label_de TEXT NOT NULL,
+    codepoint TEXT,
+    html_color TEXT,
+    is_ingredients INTEGER DEFAULT 0
+);
+
+-- Folders
+CREATE TABLE IF NOT EXISTS folders (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    parent_id INTEGER,
+    name TEXT NOT NULL,
+    FOREIGN KEY(parent_id) REFERENCES folders(id)
+);
+CREATE INDEX IF NOT EXISTS idx_folders_parent ON folders(parent_id);
+
+-- Recipes (Erweitert um 'source' und 'preamble')
+CREATE TABLE IF NOT EXISTS recipes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    folder_id INTEGER,
+    owner_id INTEGER,
+    name TEXT NOT NULL,
+    author TEXT,
+    source TEXT,
+    preamble TEXT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY(folder_id) REFERENCES folders(id),
+    FOREIGN KEY(owner_id) REFERENCES users(id)
+);
+-- Ordnerfilter der Rezeptliste (folder_id IN Unterordner)
+CREATE INDEX IF NOT EXISTS idx_recipes_folder ON recipes(folder_id);
+
+-- Steps (Erweitert um 'category_id')
+CREATE TABLE IF NOT EXISTS steps (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    recipe_id INTEGER NOT NULL,
+    category_id INTEGER NOT NULL DEFAULT 1,
+    position INTEGER NOT NULL,
+    markdown_text TEXT,
+    FOREIGN KEY(recipe_id) REFERENCES recipes(id) ON DELETE CASCADE,
+    FOREIGN KEY(category_id) REFERENCES step_categories(id)
+);
+
+-- Ingredients
+CREATE TABLE IF NOT EXISTS ingredients (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    step_id INTEGER NOT NULL,
+    unit_id INTEGER,
+    position INTEGER NOT NULL,
+    amount_min REAL,
+    amount_max REAL,
+    item TEXT NOT NULL,
+    note TEXT,
+    FOREIGN KEY(step_id) REFERENCES steps(id) ON DELETE CASCADE,
+    FOREIGN KEY(unit_id) REFERENCES units(id)
+);
+CREATE INDEX IF NOT EXISTS idx_steps_recipe_pos ON steps(recipe_id, position);
+CREATE INDEX IF NOT EXISTS idx_ing_step_pos ON ingredients(step_id, position, item, note);
+
+-- updated_at is bumped once per save by the app (routers/recipes.py), not per ingredient row
+DROP TRIGGER IF EXISTS update_recipe_timestamp_after_ingredient_update;
+
+-- Full-Text Search (FTS5) for recipes
+-- Always rebuild as a non-contentless FTS table to keep triggers simple.
+DROP TRIGGER IF EXISTS recipe_fts_ai;
+DROP TRIGGER IF EXISTS recipe_fts_au;
+DROP TRIGGER IF EXISTS recipe_fts_ad;
+DROP TRIGGER IF EXISTS recipe_fts_steps_ai;
+DROP TRIGGER IF EXISTS recipe_fts_steps_au;
+DROP TRIGGER IF EXISTS recipe_fts_steps_ad;
+DROP TRIGGER IF EXISTS recipe_fts_ing_ai;
+DROP TRIGGER IF EXISTS recipe_fts_ing_au;
+DROP TRIGGER IF EXISTS recipe_fts_ing_ad;
+DROP TABLE IF EXISTS recipe_fts;
+CREATE TABLE IF NOT EXISTS fts_dirty (recipe_id INTEGER PRIMARY KEY);
+CREATE VIRTUAL TABLE recipe_fts USING fts5(
+    name,
+    author,
+    source,
+    preamble,
+    ingredients,
+    steps
+);
+"""
+
+# FTS triggers one statement at a time: a second executescript() would commit the setup transaction
+FTS_TRIGGERS = (
+    """
+    -- Recipes INSERT
+    CREATE TRIGGER recipe_fts_ai AFTER INSERT ON recipes
+    BEGIN
+        INSERT INTO recipe_fts(rowid, name, author, source, preamble, ingredients, steps)
+        VALUES(
+            NEW.id,
+            COALESCE(NEW.name, ''),
+            COALESCE(NEW.author, ''),
+            COALESCE(NEW.source, ''),
+            COALESCE(NEW.preamble, ''),
+            '',
+            ''
+        );
+    END
+    """,
+    """
+    -- Recipes UPDATE
+    CREATE TRIGGER recipe_fts_au AFTER UPDATE ON recipes
+    WHEN NEW.name IS NOT OLD.name OR NEW.author IS NOT OLD.author
+         OR NEW.source IS NOT OLD.source OR NEW.preamble IS NOT OLD.preamble
+    BEGIN
+        UPDATE recipe_fts SET
+            name = COALESCE(NEW.name, ''),
+            author = COALESCE(NEW.author, ''),
+            source = COALESCE(NEW.source, ''),
+            preamble = COALESCE(NEW.preamble, '')
+        WHERE rowid = NEW.id;
+    END
+    """,
+    """
+    -- Recipes DELETE
+    CREATE TRIGGER recipe_fts_ad AFTER DELETE ON recipes
+    BEGIN
+        DELETE FROM recipe_fts WHERE rowid = OLD.id;
+    END
+    """,
+    """
+    -- Steps/Ingredients INSERT/UPDATE/DELETE → only queue the recipe,
+    -- flush_fts() rebuilds the steps/ingredients columns once per recipe
+    CREATE TRIGGER recipe_fts_steps_ai AFTER INSERT ON steps
+    BEGIN
+        INSERT OR IGNORE INTO fts_dirty(recipe_id) VALUES (NEW.recipe_id);
+    END
+    """,
+    """
+    CREATE TRIGGER recipe_fts_steps_au AFTER UPDATE ON steps
+    WHEN NEW.markdown_text IS NOT OLD.markdown_text OR NEW.position IS NOT OLD.position
+         OR NEW.recipe_id IS NOT OLD.recipe_id
+    BEGIN
+        INSERT OR IGNORE INTO fts_dirty(recipe_id) VALUES (OLD.recipe_id), (NEW.recipe_id);
+    END
+    """,
+    """
+    CREATE TRIGGER recipe_fts_steps_ad AFTER DELETE ON steps
+    BEGIN
+        INSERT OR IGNORE INTO fts_dirty(recipe_id) VALUES (OLD.recipe_id);
+    END
+    """,
+    """
+    CREATE TRIGGER recipe_fts_ing_ai AFTER INSERT ON ingredients
+    BEGIN
+        INSERT OR IGNORE INTO fts_dirty(recipe_id)
+        SELECT recipe_id FROM steps WHERE id = NEW.step_id;
+    END
+    """,
+    """
+    CREATE TRIGGER recipe_fts_ing_au AFTER UPDATE ON ingredients
+    WHEN NEW.item IS NOT OLD.item OR NEW.note IS NOT OLD.note
+         OR NEW.position IS NOT OLD.position OR NEW.step_id IS NOT OLD.step_id
+    BEGIN
+        INSERT OR IGNORE INTO fts_dirty(recipe_id)
+        SELECT recipe_id FROM steps WHERE id IN (OLD.step_id, NEW.step_id);
+    END
+    """,
+    """
+    CREATE TRIGGER recipe_fts_ing_ad AFTER DELETE ON ingredients
+    BEGIN
+        INSERT OR IGNORE INTO fts_dirty(recipe_id)
+        SELECT recipe_id FROM steps WHERE id = OLD.step_id;
+    END
+    """,
+)
+
+# --- Seed data ---
+# Step Categories (Mit deinen neuen Codes!)
+CATEGORIES_DATA = (
+    (1, 'default', 'Zubereitung', '', None, 1),              # Kein Hintergrund
+    (2, 'warning', 'Achtung', 'E4E0', "#FF0000", 0),
+    (3, 'info', 'Info', 'E2CE', "#006EFF", 0),
+    (4, 'variation', 'Variante', 'E422', "#7B00FF", 0),
+    (5, 'tip', 'Tipp', 'E2DC', "#FFCC00", 0),
+)
+
+# Units
+UNITS_DATA = (
+    ('Gramm', 'g', r'\gram', 'si'),
+    ('Kilogramm', 'kg', r'\kilogram', 'si'),
+    ('Milliliter', 'ml', r'\milli\liter', 'si'),
+    ('Deziliter', 'dl', r'\deci\liter', 'si'),
+    ('Liter', 'l', r'\liter', 'si'),
+    ('Grad Celsius', '°C', r'\degreeCelsius', 'si'),
+    ('Esslöffel', 'EL', 'EL', 'text'),
+    ('Teelöffel', 'TL', 'TL', 'text'),
+    ('Prise', 'Prise', 'Prise', 'text'),
+    ('Messerspitze', 'Msp.', 'Msp.', 'text'),
+    ('Stück', 'Stk.', 'Stk', 'text'),
+    ('Packung', 'Pkg.', 'Pkg.', 'text'),
+    ('Tropfen', 'Tr.', 'Tr', 'text'),
+)
+
+# PRAGMA user_version after a completed setup; bump when a SCHEMA_DDL or seed change must
+# also reach databases that are already set up (schema changes usually go to database.py migrations)
+SETUP_VERSION = 1
+
 def init_db():
     db_path = get_db_path()
     print(f"--> Initializing database at: {db_path}")
     
     os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    new_db = not os.path.exists(db_path) or os.path.getsize(db_path) == 0
     
-    conn = sqlite3.connect(db_path)
+    # Transaktion selbst steuern: das ganze Setup ist ein BEGIN IMMEDIATE ... COMMIT
+    conn = sqlite3.connect(db_path, isolation_level=None)
     cursor = conn.cursor()
+
+    # Already set up (and possibly migrated further by the app): nothing to do.
+    # To repair the search index use tools/refresh_fts.py.
+    if not new_db and cursor.execute("PRAGMA user_version").fetchone()[0] >= SETUP_VERSION:
+        conn.close()
+        print("--> Database already initialized, nothing to do.")
+        return
     
-    # 1. Enable foreign keys
+    # 0. File layout, only for a new file: takes effect before the first CREATE (and before WAL),
+    # so no VACUUM is needed. Existing databases keep their layout.
+    if new_db:
+        cursor.execute("PRAGMA page_size = 8192")  # flachere B-Trees, v.a. für die FTS-Segmente
+        cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+
+    # 1. Enable foreign keys, connection tuning (PRAGMAs must run outside the transaction)
     cursor.execute("PRAGMA foreign_keys = ON;")
+    cursor.execute("PRAGMA journal_mode = WAL")
+    cursor.execute("PRAGMA synchronous = NORMAL")
+    cursor.execute("PRAGMA temp_store = MEMORY")
+    cursor.execute("PRAGMA cache_size = -64000")
 
-    # 2. Metadata table for schema versioning
-    cursor.execute(
-        """
-        CREATE TABLE IF NOT EXISTS db_metadata (
-            key TEXT PRIMARY KEY,
-            value TEXT
-        );
-        """
-    )
-    
-    # --- Tables ---
-
-    # Users
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        username TEXT UNIQUE NOT NULL,
-        password_hash TEXT NOT NULL,
-        display_name TEXT NOT NULL,
-        role TEXT DEFAULT 'guest',
-        is_active INTEGER DEFAULT 1,
-        email TEXT
-    );
-    """)
-
-    # Sessions (server-side session store)
-    cursor.execute(
-        """
-        CREATE TABLE IF NOT EXISTS sessions (
-            id TEXT PRIMARY KEY,
-            user_id INTEGER NOT NULL,
-            created_at TEXT NOT NULL,
-            expires_at TEXT NOT NULL,
-            last_seen TEXT NOT NULL,
-            user_agent TEXT,
-            ip_address TEXT,
-            FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
-        );
-        """
-    )
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sessions_user_id ON sessions(user_id)")
-    
-    # Units
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS units (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT NOT NULL,
-        symbol TEXT NOT NULL,
-        latex_code TEXT NOT NULL,
-        type TEXT DEFAULT 'si'
-    );
-    """)
-
-    # Step Categories (NEU)
-    # codepoint: Der Unicode-Codepunkt für das Icon (z.B. "E4E0")
-    # is_ingredients: Boolean Flag (1/0), ob hier Zutaten angezeigt werden sollen oder das Icon
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS step_categories (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT NOT NULL UNIQUE, 
-        label_de TEXT NOT NULL,
-        codepoint TEXT,
-        html_color TEXT, 
-        is_ingredients INTEGER DEFAULT 0
-    );
-    """)
-    
-    # Folders
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS folders (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        parent_id INTEGER,
-        name TEXT NOT NULL,
-        FOREIGN KEY(parent_id) REFERENCES folders(id)
-    );
-    """)
-    
-    # Recipes (Erweitert um 'source' und 'preamble')
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS recipes (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        folder_id INTEGER,
-        owner_id INTEGER,
-        name TEXT NOT NULL,
-        author TEXT,
-        source TEXT,
-        preamble TEXT,
-        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY(folder_id) REFERENCES folders(id),
-        FOREIGN KEY(owner_id) REFERENCES users(id)
-    );
-    """)
-    
-    # Steps (Erweitert um 'category_id')
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS steps (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        recipe_id INTEGER NOT NULL,
-        category_id INTEGER NOT NULL DEFAULT 1,
-        position INTEGER NOT NULL,
-        markdown_text TEXT,
-        FOREIGN KEY(recipe_id) REFERENCES recipes(id) ON DELETE CASCADE,
-        FOREIGN KEY(category_id) REFERENCES step_categories(id)
-    );
-    """)
-    
-    # Ingredients
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS ingredients (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        step_id INTEGER NOT NULL,
-        unit_id INTEGER,
-        position INTEGER NOT NULL,
-        amount_min REAL,
-        amount_max REAL,
-        item TEXT NOT NULL,
-        note TEXT,
-        FOREIGN KEY(step_id) REFERENCES steps(id) ON DELETE CASCADE,
-        FOREIGN KEY(unit_id) REFERENCES units(id)
-    );
-    """)
-    
-    # Trigger
-    cursor.execute("""
-    CREATE TRIGGER IF NOT EXISTS update_recipe_timestamp_after_ingredient_update
-    AFTER UPDATE ON ingredients
-    BEGIN
-        UPDATE recipes 
-        SET updated_at = CURRENT_TIMESTAMP 
-        WHERE id = (SELECT recipe_id FROM steps WHERE id = NEW.step_id);
-    END;
-    """)
-
-    # --- Full-Text Search (FTS5) for recipes ---
-    # Always rebuild as a non-contentless FTS table to keep triggers simple.
-    trigger_names = [
-        "recipe_fts_ai", "recipe_fts_au", "recipe_fts_ad",
-        "recipe_fts_steps_ai", "recipe_fts_steps_au", "recipe_fts_steps_ad",
-        "recipe_fts_ing_ai", "recipe_fts_ing_au", "recipe_fts_ing_ad"
-    ]
-    for t in trigger_names:
-        cursor.execute(f"DROP TRIGGER IF EXISTS {t}")
-
-    cursor.execute("DROP TABLE IF EXISTS recipe_fts")
-    cursor.execute(
-        """
-        CREATE VIRTUAL TABLE recipe_fts USING fts5(
-            name,
-            author,
-            source,
-            preamble,
-            ingredients,
-            steps
-        );
-        """
-    )
+    # 2. Schema (tables, indexes, FTS table) in one script
+    cursor.executescript(SCHEMA_DDL)
 
-    cursor.executescript(
-        """
-                -- Recipes INSERT
-                CREATE TRIGGER recipe_fts_ai AFTER INSERT ON recipes
-                BEGIN
-                    INSERT INTO recipe_fts(rowid, name, author, source, preamble, ingredients, steps)
-                    VALUES(
-                        NEW.id,
-                        COALESCE(NEW.name, ''),
-                        COALESCE(NEW.author, ''),
-                        COALESCE(NEW.source, ''),
-                        COALESCE(NEW.preamble, ''),
-                        '',
-                        ''
-                    );
-                END;
-
-                -- Recipes UPDATE
-                CREATE TRIGGER recipe_fts_au AFTER UPDATE ON recipes
-                BEGIN
-                    UPDATE recipe_fts SET
-                        name = COALESCE(NEW.name, ''),
-                        author = COALESCE(NEW.author, ''),
-                        source = COALESCE(NEW.source, ''),
-                        preamble = COALESCE(NEW.preamble, '')
-                    WHERE rowid = NEW.id;
-                END;
-
-                -- Recipes DELETE
-                CREATE TRIGGER recipe_fts_ad AFTER DELETE ON recipes
-                BEGIN
-                    DELETE FROM recipe_fts WHERE rowid = OLD.id;
-                END;
-
-                -- Steps INSERT/UPDATE/DELETE → refresh steps column
-                CREATE TRIGGER recipe_fts_steps_ai AFTER INSERT ON steps
-                BEGIN
-                    UPDATE recipe_fts SET steps = 
-                        COALESCE((SELECT group_concat(markdown_text, ' ') FROM (
-                            SELECT markdown_text FROM steps WHERE recipe_id = NEW.recipe_id ORDER BY position
-                        )), '')
-                    WHERE rowid = NEW.recipe_id;
-                END;
-
-                CREATE TRIGGER recipe_fts_steps_au AFTER UPDATE ON steps
-                BEGIN
-                    UPDATE recipe_fts SET steps = 
-                        COALESCE((SELECT group_concat(markdown_text, ' ') FROM (
-                            SELECT markdown_text FROM steps WHERE recipe_id = NEW.recipe_id ORDER BY position
-                        )), '')
-                    WHERE rowid = NEW.recipe_id;
-                END;
-
-                CREATE TRIGGER recipe_fts_steps_ad AFTER DELETE ON steps
-                BEGIN
-                    UPDATE recipe_fts SET steps = 
-                        COALESCE((SELECT group_concat(markdown_text, ' ') FROM (
-                            SELECT markdown_text FROM steps WHERE recipe_id = OLD.recipe_id ORDER BY position
-                        )), '')
-                    WHERE rowid = OLD.recipe_id;
-                END;
-
-                -- Ingredients INSERT/UPDATE/DELETE → refresh ingredients column
-                CREATE TRIGGER recipe_fts_ing_ai AFTER INSERT ON ingredients
-                BEGIN
-                    UPDATE recipe_fts SET ingredients = 
-                        COALESCE((SELECT group_concat(item || ' ' || COALESCE(note,''), ' ') FROM (
-                            SELECT i.item, i.note FROM ingredients i JOIN steps s ON i.step_id = s.id
-                            WHERE s.recipe_id = (SELECT recipe_id FROM steps WHERE id = NEW.step_id)
-                            ORDER BY s.position, i.position
-                        )), '')
-                    WHERE rowid = (SELECT recipe_id FROM steps WHERE id = NEW.step_id);
-                END;
-
-                CREATE TRIGGER recipe_fts_ing_au AFTER UPDATE ON ingredients
-                BEGIN
-                    UPDATE recipe_fts SET ingredients = 
-                        COALESCE((SELECT group_concat(item || ' ' || COALESCE(note,''), ' ') FROM (
-                            SELECT i.item, i.note FROM ingredients i JOIN steps s ON i.step_id = s.id
-                            WHERE s.recipe_id = (SELECT recipe_id FROM steps WHERE id = NEW.step_id)
-                            ORDER BY s.position, i.position
-                        )), '')
-                    WHERE rowid = (SELECT recipe_id FROM steps WHERE id = NEW.step_id);
-                END;
-
-                CREATE TRIGGER recipe_fts_ing_ad AFTER DELETE ON ingredients
-                BEGIN
-                    UPDATE recipe_fts SET ingredients = 
-                        COALESCE((SELECT group_concat(item || ' ' || COALESCE(note,''), ' ') FROM (
-                            SELECT i.item, i.note FROM ingredients i JOIN steps s ON i.step_id = s.id
-                            WHERE s.recipe_id = (SELECT recipe_id FROM steps WHERE id = OLD.step_id)
-                            ORDER BY s.position, i.position
-                        )), '')
-                    WHERE rowid = (SELECT recipe_id FROM steps WHERE id = OLD.step_id);
-                END;
-                """
-        )
+    for trigger_sql in FTS_TRIGGERS:
+        cursor.execute(trigger_sql)
 
     # --- Seeding Data ---
-    # 1. Step Categories (Mit deinen neuen Codes!)
-    categories_data = [
-        (1, 'default', 'Zubereitung', '', None, 1),              # Kein Hintergrund
-        (2, 'warning', 'Achtung', 'E4E0', "#FF0000", 0), 
-        (3, 'info', 'Info', 'E2CE', "#006EFF", 0),            
-        (4, 'variation', 'Variante', 'E422', "#7B00FF", 0),       
-        (5, 'tip', 'Tipp', 'E2DC', "#FFCC00", 0)               
-    ]
-    cursor.execute("SELECT count(*) FROM step_categories")
-    if cursor.fetchone()[0] == 0:
+    # Which tables are still empty: one statement, EXISTS stops at the first row
+    has_categories, has_units, has_users, has_folders = cursor.execute(
+        """
+        SELECT EXISTS (SELECT 1 FROM step_categories),
+               EXISTS (SELECT 1 FROM units),
+               EXISTS (SELECT 1 FROM users),
+               EXISTS (SELECT 1 FROM folders)
+        """
+    ).fetchone()
+
+    # 1. Step Categories
+    if not has_categories:
         print("--> Seeding step categories...")
-        cursor.executemany("INSERT INTO step_categories (id, name, label_de, codepoint, html_color, is_ingredients) VALUES (?, ?, ?, ?, ?, ?)", categories_data)
+        insert_rows(cursor, "INSERT INTO step_categories (id, name, label_de, codepoint, html_color, is_ingredients)", CATEGORIES_DATA)
 
     # 2. Units
-    units_data = [
-        ('Gramm', 'g', r'\gram', 'si'),
-        ('Kilogramm', 'kg', r'\kilogram', 'si'),
-        ('Milliliter', 'ml', r'\milli\liter', 'si'),
-        ('Deziliter', 'dl', r'\deci\liter', 'si'),
-        ('Liter', 'l', r'\liter', 'si'),
-        ('Grad Celsius', '°C', r'\degreeCelsius', 'si'),
-        ('Esslöffel', 'EL', 'EL', 'text'),
-        ('Teelöffel', 'TL', 'TL', 'text'),
-        ('Prise', 'Prise', 'Prise', 'text'),
-        ('Messerspitze', 'Msp.', 'Msp.', 'text'),
-        ('Stück', 'Stk.', 'Stk', 'text'),
-        ('Packung', 'Pkg.', 'Pkg.', 'text'),
-        ('Tropfen', 'Tr.', 'Tr', 'text')
-    ]
-    cursor.execute("SELECT count(*) FROM units")
-    if cursor.fetchone()[0] == 0:
+    if not has_units:
         print("--> Seeding units...")
-        cursor.executemany("INSERT INTO units (name, symbol, latex_code, type) VALUES (?, ?, ?, ?)", units_data)
+        insert_rows(cursor, "INSERT INTO units (name, symbol, latex_code, type)", UNITS_DATA)
 
     # 3. Admin User
-    cursor.execute("SELECT count(*) FROM users")
-    if cursor.fetchone()[0] == 0:
+    if not has_users:
         print("--> Creating default admin user...")
-        admin_pass = pwd_context.hash("admin")
+        admin_pass = ADMIN_PASSWORD_HASH
         cursor.execute(
             "INSERT INTO users (username, password_hash, display_name, role) VALUES (?, ?, ?, ?)",
             ("admin", admin_pass, "System Admin", "admin")
         )
 
     # Root folder (v4 behavior)
-    cursor.execute("SELECT COUNT(*) FROM folders")
-    if cursor.fetchone()[0] == 0:
+    if not has_folders:
         print("--> Creating root folder...")
         cursor.execute("INSERT INTO folders (name) VALUES ('Hauptverzeichnis')")
 
-    # Backfill FTS (covers fresh install)
-    cursor.execute("DELETE FROM recipe_fts")
+    # Backfill FTS (covers fresh install), makes the queue obsolete;
+    # one grouped pass per child table instead of correlated subqueries per recipe.
+    # recipe_fts was just recreated by SCHEMA_DDL, so there is nothing to delete first.
+    cursor.execute("DELETE FROM fts_dirty")
     cursor.execute(
         """
+        WITH ing_agg AS (
+            SELECT recipe_id, group_concat(item || ' ' || COALESCE(note,''), ' ') AS ingredients
+            FROM (
+                SELECT s.recipe_id, i.item, i.note FROM ingredients i JOIN steps s ON i.step_id = s.id
+                ORDER BY s.recipe_id, s.position, i.position
+            )
+            GROUP BY recipe_id
+        ),
+        step_agg AS (
+            SELECT recipe_id, group_concat(markdown_text, ' ') AS steps
+            FROM (SELECT recipe_id, markdown_text FROM steps ORDER BY recipe_id, position)
+            GROUP BY recipe_id
+        )
         INSERT INTO recipe_fts(rowid, name, author, source, preamble, ingredients, steps)
         SELECT
             r.id,
@@ -355,23 +397,23 @@ def init_db():
             COALESCE(r.author, ''),
             COALESCE(r.source, ''),
             COALESCE(r.preamble, ''),
-            COALESCE((SELECT group_concat(item || ' ' || COALESCE(note,''), ' ') FROM (
-                SELECT i.item, i.note FROM ingredients i JOIN steps s ON i.step_id = s.id
-                WHERE s.recipe_id = r.id ORDER BY s.position, i.position
-            )), ''),
-            COALESCE((SELECT group_concat(markdown_text, ' ') FROM (
-                SELECT markdown_text FROM steps WHERE recipe_id = r.id ORDER BY position
-            )), '')
-        FROM recipes r;
+            COALESCE(ia.ingredients, ''),
+            COALESCE(sa.steps, '')
+        FROM recipes r
+        LEFT JOIN ing_agg ia ON ia.recipe_id = r.id
+        LEFT JOIN step_agg sa ON sa.recipe_id = r.id;
         """
     )
+    # Merge the segments written by the bulk insert into a single b-tree
+    cursor.execute("INSERT INTO recipe_fts(recipe_fts) VALUES('optimize')")
 
     # Persist schema version
     cursor.execute(
         "INSERT OR REPLACE INTO db_metadata (key, value) VALUES ('schema_version', '5')"
     )
+    cursor.execute(f"PRAGMA user_version = {SETUP_VERSION}")
 
-    conn.commit()
+    cursor.execute("COMMIT")
     conn.close()
     print("--> Database initialized successfully.")
 